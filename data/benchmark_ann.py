@@ -0,0 +1,72 @@
+from chromadb import HttpClient
+import json
+import os
+
+from utils.local_index import LocalIndex, export_collection, sample_query_vectors, evaluate_recall
+from utils.ann import ANNIndex, build_ann_index
+
+INDEX_DIR = "indexes"
+# The largest collections benefit the most from ANN search
+COLLECTION_NAMES = [
+    "Recursive_character_size-500_overlap-10",
+    "Semantic_chunker_50th_percentile",
+    "Recursive_character_size-1500_overlap-15",
+]
+K = 20
+N_QUERIES = 200
+EF_SEARCH_VALUES = [16, 32, 64, 128, 256]
+NPROBE_VALUES = [1, 4, 8, 16, 32]
+REPORT_FILE = "ann_report.json"
+
+
+def benchmark_collection(index_dir):
+    """
+    Sweeps the search-time knobs of each ANN backend and compares them with the exact search.
+    Returns:
+        results (list): recall@K and mean latency per backend and knob value.
+    """
+    baseline = LocalIndex(index_dir)
+    query_vectors = sample_query_vectors(baseline, N_QUERIES)
+
+    _, exact_ms = evaluate_recall(baseline, baseline, query_vectors, K)
+    results = [{"backend": "exact", "recall": 1.0, "latency_ms": exact_ms}]
+    print(f" exact                 recall=1.0000 latency={exact_ms:.2f} ms")
+
+    for backend, knob, values in [("hnsw", "ef_search", EF_SEARCH_VALUES), ("ivf", "nprobe", NPROBE_VALUES)]:
+        build_ann_index(index_dir, backend)
+        index = ANNIndex(index_dir, backend)
+        for value in values:
+            recall, latency_ms = evaluate_recall(index, baseline, query_vectors, K, **{knob: value})
+            results.append({"backend": backend, knob: value, "recall": recall, "latency_ms": latency_ms, "bytes": index.memory_bytes()})
+            print(f" {backend:<4} {knob}={value:<6} recall={recall:.4f} latency={latency_ms:.2f} ms")
+
+    return results
+
+def main(collection_names=COLLECTION_NAMES):
+    client = None
+    report = {}
+
+    for collection_name in collection_names:
+        index_dir = os.path.join(INDEX_DIR, collection_name)
+
+        # Export the collection from Chroma only once
+        if not os.path.exists(index_dir):
+            if client is None:
+                try:
+                    client = HttpClient(host="http://localhost:8000")
+                    print("Chroma server is running.")
+                except Exception as e:
+                    print("Chroma server is not running. Please start the server and try again.")
+                    raise e
+            export_collection(client, collection_name, index_dir)
+
+        print(f"Benchmark for '{collection_name}' (recall@{K} against exact search)")
+        report[collection_name] = benchmark_collection(index_dir)
+        print('='*50)
+
+    with open(os.path.join(INDEX_DIR, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to '{INDEX_DIR}/{REPORT_FILE}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# torch and psutil are imported by the functions that use them (see insert_data_to_chroma.py)
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import json
+import os
+
+from insert_data_to_chroma import (
+    get_device, connect_to_chroma, load_documents, load_embedding_models,
+    config_grid, collection_name_from_config, build_collection
+)
+
+# Estimated peak memory of one worker: bge-large + bge-small + documents + chunks
+WORKER_MEMORY_GB = 3.0
+# Memory available to the workers (GB), 75% of the RAM if not set
+MEMORY_CAP_GB = float(os.getenv("INDEX_MEMORY_CAP_GB", 0)) or None
+REPORT_FILE = "index_build_report.json"
+
+# Per-process state, loaded once per worker by its initializer
+worker_state = {}
+
+
+def get_memory_cap_gb():
+    import psutil
+
+    return MEMORY_CAP_GB or psutil.virtual_memory().total / 2**30 * 0.75
+
+def init_worker(device, torch_threads):
+    import torch
+
+    # Split the CPU cores between the workers instead of oversubscribing them
+    torch.set_num_threads(torch_threads)
+    worker_state["documents"] = load_documents()
+    worker_state["models"] = load_embedding_models(device)
+    # HTTP connections can not be shared between processes
+    worker_state["client"] = connect_to_chroma()
+
+def build_job(config):
+    import psutil
+
+    chunk_embedding_model, embedding_model = worker_state["models"]
+    stats = build_collection(config, worker_state["documents"], chunk_embedding_model, embedding_model, worker_state["client"])
+    # Resident memory of the worker after the build
+    stats["rss_gb"] = psutil.Process().memory_info().rss / 2**30
+    return stats
+
+def get_max_workers(n_jobs, device, memory_cap_gb=None):
+    """
+    Number of worker processes allowed by the memory cap and the CPU cores.
+    """
+    memory_cap_gb = memory_cap_gb or get_memory_cap_gb()
+    if device == "cuda":
+        # A single GPU is shared, one process keeps it busy
+        return 1
+    by_memory = int(memory_cap_gb // WORKER_MEMORY_GB)
+    return max(1, min(n_jobs, os.cpu_count() or 1, by_memory))
+
+def main(configs=None, max_workers=None):
+    print('-'*50)
+    device = get_device()
+    configs = configs or config_grid()
+    max_workers = max_workers or get_max_workers(len(configs), device)
+    torch_threads = max(1, (os.cpu_count() or 1) // max_workers)
+    print(f"Building {len(configs)} collections with {max_workers} worker processes ({torch_threads} threads each), memory cap {get_memory_cap_gb():.1f} GB")
+    print('-'*50)
+
+    # Workers are spawned and load their own models in the initializer: forking a parent whose
+    # torch / OpenMP and tokenizers thread pools are already running can deadlock
+    report = []
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(device, torch_threads)
+    ) as executor:
+        futures = {executor.submit(build_job, config): config for config in configs}
+        for future in as_completed(futures):
+            name = collection_name_from_config(futures[future])
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"[ERROR] Failed to build {name}: {e}")
+                report.append({"collection_name": name, "error": str(e)})
+                continue
+
+            total_seconds = stats["chunk_seconds"] + stats["index_seconds"]
+            stats["total_seconds"] = total_seconds
+            stats["chunks_per_second"] = stats["chunks"] / stats["index_seconds"] if stats["index_seconds"] else 0.0
+            report.append(stats)
+            status = "SKIP" if stats["skipped"] else "OK"
+            print(f"[{status}] {name}: {stats['chunks']} chunks in {total_seconds:.1f} s "
+                  f"(chunking {stats['chunk_seconds']:.1f} s, indexing {stats['chunks_per_second']:.1f} chunks/s)")
+
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print('-'*50)
+    print(f"Build report saved to '{REPORT_FILE}'")
+
+if __name__ == "__main__":
+    main()
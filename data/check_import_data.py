@@ -0,0 +1,134 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import Counter
+import tempfile
+import threading
+import hashlib
+import json
+import os
+
+import import_data
+
+# Fixture site: two historical calendars and the current one.
+# The December 2023 PDF is listed on two calendars and the January 2024 page on two others,
+# like a meeting that appears on both a historical and the current calendar.
+PDFS = {
+    "/mediacenter/files/FOMCpresconf20231213.pdf": b"%PDF-1.4 December 2023 press conference",
+    "/mediacenter/files/FOMCpresconf20230201.pdf": b"%PDF-1.4 February 2023 press conference",
+    "/mediacenter/files/FOMCpresconf20240131.pdf": b"%PDF-1.4 January 2024 press conference",
+    "/mediacenter/files/FOMCpresconf20250129.pdf": b"%PDF-1.4 January 2025 press conference",
+}
+PAGES = {
+    "/monetarypolicy/fomchistorical2023.htm": [
+        "/monetarypolicy/fomcpresconf20230201.htm",
+        "/mediacenter/files/FOMCpresconf20231213.pdf",
+    ],
+    "/monetarypolicy/fomchistorical2024.htm": [
+        "/mediacenter/files/FOMCpresconf20231213.pdf",
+        "/monetarypolicy/fomcpresconf20240131.htm",
+    ],
+    "/monetarypolicy/fomccalendars.htm": [
+        "/monetarypolicy/fomcpresconf20240131.htm",
+        "/monetarypolicy/fomcpresconf20250129.htm",
+    ],
+    "/monetarypolicy/fomcpresconf20230201.htm": ["/mediacenter/files/FOMCpresconf20230201.pdf"],
+    "/monetarypolicy/fomcpresconf20240131.htm": ["/mediacenter/files/FOMCpresconf20240131.pdf"],
+    "/monetarypolicy/fomcpresconf20250129.htm": ["/mediacenter/files/FOMCpresconf20250129.pdf"],
+}
+EXPECTED_FILES = {
+    "20230201_PressConference.pdf": PDFS["/mediacenter/files/FOMCpresconf20230201.pdf"],
+    "20231213_PressConference.pdf": PDFS["/mediacenter/files/FOMCpresconf20231213.pdf"],
+    "20240131_PressConference.pdf": PDFS["/mediacenter/files/FOMCpresconf20240131.pdf"],
+    "20250129_PressConference.pdf": PDFS["/mediacenter/files/FOMCpresconf20250129.pdf"],
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in of the Federal Reserve website, serving the fixture calendars and PDFs.
+    PDFs have an ETag and answer conditional requests with 304. Requests are counted per path
+    in the server attribute `requests`.
+    """
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests[self.path] += 1
+
+        if self.path in PDFS:
+            content = PDFS[self.path]
+            etag = '"' + hashlib.md5(content).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("ETag", etag)
+        elif self.path in PAGES:
+            links = "".join(f'<a href="{href}">Press Conference</a>\n' for href in PAGES[self.path])
+            content = f"<html><body>{links}</body></html>".encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+        else:
+            self.send_error(404)
+            return
+
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def start_fixture_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = Counter()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def check_downloads(output_dir):
+    files = sorted(name for name in os.listdir(output_dir) if name != import_data.MANIFEST_FILE)
+    assert files == sorted(EXPECTED_FILES), f"Unexpected files: {files}"
+    for name, content in EXPECTED_FILES.items():
+        with open(os.path.join(output_dir, name), "rb") as f:
+            assert f.read() == content, f"Corrupted download: {name}"
+
+    with open(os.path.join(output_dir, import_data.MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert sorted(manifest) == sorted(EXPECTED_FILES), f"Unexpected manifest entries: {sorted(manifest)}"
+    assert all(entry["etag"] for entry in manifest.values()), "Missing ETag in the manifest"
+
+def main():
+    print('-'*50)
+    server = start_fixture_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"Fixture server on {base_url}")
+    print('-'*50)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        import_data.main(base_url=base_url, output_dir=output_dir, start_year=2023, current_year=2025)
+        check_downloads(output_dir)
+        # Every PDF is fetched once, even those listed on several calendars
+        fetched = {path: server.requests[path] for path in PDFS}
+        assert all(count == 1 for count in fetched.values()), f"PDFs fetched more than once: {fetched}"
+        print('-'*50)
+        print("First crawl: every transcript downloaded once")
+        print('-'*50)
+
+        # A second crawl only revalidates the PDFs (304) and leaves the files untouched
+        server.requests.clear()
+        import_data.main(base_url=base_url, output_dir=output_dir, start_year=2023, current_year=2025)
+        check_downloads(output_dir)
+        fetched = {path: server.requests[path] for path in PDFS}
+        assert all(count == 1 for count in fetched.values()), f"PDFs revalidated more than once: {fetched}"
+        print('-'*50)
+        print("Second crawl: every transcript revalidated, nothing downloaded again")
+
+    server.shutdown()
+    print('-'*50)
+    print("Crawler checks passed")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 from langchain_community.document_loaders import PyPDFDirectoryLoader 
+from langchain_core.documents import Document
 import os
 import joblib
 import spacy
 
+from utils.sections import split_speakers, is_chair_speaker, OPENING_STATEMENT, QUESTION, CHAIR_ANSWER
+
 INPUT_DIR = "raw"
 OUTPUT_DIR = "clean"
-METADATA_TO_KEEP = ['creationdate', 'total_pages', 'page']
+METADATA_TO_KEEP = ['creationdate', 'total_pages', 'page', 'section', 'speaker']
 
 # If the output directory doesn't exist, creates it
 def setup_directory(output_dir=OUTPUT_DIR):
@@ -37,6 +40,53 @@ def remove_first_last_line(raw_document):
     raw_document.page_content = new_text
     return raw_document
 
+def segment_transcript(pages):
+    """
+    Splits the pages of one transcript into speaker turns, before lemmatization removes the markers.
+    The Chair's turns before the first question are the opening statement, the other speakers'
+    turns are questions (moderator included) and the Chair's later turns are answers.
+    The opening statement only ends at the first turn of another speaker after the Chair has spoken,
+    so an introduction by the moderator does not make the statement an answer.
+    A turn that continues on the next page keeps its speaker and section.
+    Args:
+        pages (list): Documents of the pages of one transcript, in page order.
+    Returns:
+        segments (list): One document per speaker turn and page, with "section" and "speaker" metadata.
+    """
+    segments = []
+    speaker, section = None, None
+    chair_spoke, questions_started = False, False
+    for page in pages:
+        for turn_speaker, text in split_speakers(page.page_content):
+            if turn_speaker is not None:
+                speaker = turn_speaker
+                if is_chair_speaker(speaker):
+                    section = CHAIR_ANSWER if questions_started else OPENING_STATEMENT
+                    chair_spoke = True
+                else:
+                    section, questions_started = QUESTION, chair_spoke
+            if not text:
+                continue
+            metadata = dict(page.metadata)
+            # Text before the first marker of a transcript has no known speaker
+            if section is not None:
+                metadata.update({'section': section, 'speaker': speaker})
+            segments.append(Document(page_content=text, metadata=metadata))
+    return segments
+
+def segment_documents(raw_documents):
+    """
+    Segments every transcript (the pages of one PDF) into speaker turns.
+    """
+    transcripts = {}
+    for doc in raw_documents:
+        transcripts.setdefault(doc.metadata.get('source'), []).append(doc)
+
+    segments = []
+    for pages in transcripts.values():
+        segments.extend(segment_transcript(sorted(pages, key=lambda doc: doc.metadata.get('page', 0))))
+    return segments
+
 def filter_lemmatize(raw_document, nlp): # Pass the whole object
     """
     Remove stop words and lemmatize, then update the document content.
@@ -72,6 +122,10 @@ def clean_data(output_dir=OUTPUT_DIR, input_dir=INPUT_DIR):
     cutted_documents = [remove_first_last_line(doc) for doc in raw_documents]
     print("First and last lines removed from each document.")
 
+    # Split the pages into speaker turns while the "MR. NAME" markers are still there
+    segmented_documents = segment_documents(cutted_documents)
+    print(f"Pages segmented into {len(segmented_documents)} speaker turns.")
+
     # Load spaCy model (just the tokenizer and lemmatizer)
     nlp = spacy.load("en_core_web_sm", disable=["parser", "ner", "textcat"])
     print("spaCy model loaded.")
@@ -83,7 +137,7 @@ def clean_data(output_dir=OUTPUT_DIR, input_dir=INPUT_DIR):
         nlp.vocab[word].is_stop = False
 
     # Remove stop words and lemmatize
-    root_documents = [filter_lemmatize(doc, nlp) for doc in cutted_documents]
+    root_documents = [filter_lemmatize(doc, nlp) for doc in segmented_documents]
     print("Stop words removed and lemmatization applied.")
 
     # Clean metadata
@@ -1,53 +1,172 @@
 import os
-import requests
 import re
+import json
 import time
+import threading
+import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 
 # Define constants
-BASE_URL = "https://www.federalreserve.gov"
+# The base url can be pointed to a local stand-in server serving fixture calendars and PDFs
+BASE_URL = os.environ.get("FED_BASE_URL", "https://www.federalreserve.gov")
 OUTPUT_DIR = "raw"
+MANIFEST_FILE = "manifest.json"
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
 
-def setup_directory():
+# Crawler limits
+MAX_WORKERS = 4             # Bounded number of concurrent requests
+MIN_REQUEST_INTERVAL = 0.5  # Seconds between two requests to the same host (trying to not get blocked)
+CHUNK_SIZE = 64 * 1024      # Bytes written to disk per chunk while streaming
+TIMEOUT = 30
+
+
+class HostRateLimiter:
+    """
+    Polite per-host rate limiter shared by all the worker threads.
+    Each host gets at most one request every `min_interval` seconds.
+    """
+    def __init__(self, min_interval=MIN_REQUEST_INTERVAL):
+        self.min_interval = min_interval
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        # Reserve the next free slot for this host, then sleep outside the lock
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Manifest:
+    """
+    Resumable record of the downloaded PDFs: url, ETag, Last-Modified and size per file.
+    It is rewritten atomically after every completed download, so an interrupted
+    crawl can be resumed from where it stopped.
+    """
+    def __init__(self, output_dir=OUTPUT_DIR):
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, filename):
+        with self.lock:
+            return self.entries.get(filename)
+
+    def update(self, filename, entry):
+        with self.lock:
+            self.entries[filename] = entry
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+def create_session(max_workers=MAX_WORKERS):
+    """
+    Creates a pooled HTTP session with retries on transient errors.
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+
+    retries = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
+
+def setup_directory(output_dir=OUTPUT_DIR):
     # Create output directory if it doesn't exist
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        print(f"Directory '{OUTPUT_DIR}' created.") 
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"Directory '{output_dir}' created.")
+
+def fetch(session, limiter, url, **kwargs):
+    # Every request goes through the rate limiter of its host
+    limiter.wait(url)
+    return session.get(url, timeout=TIMEOUT, **kwargs)
 
-def download_pdf(url, filename):
-    filepath = os.path.join(OUTPUT_DIR, filename)
+def download_pdf(session, limiter, manifest, url, filename, output_dir=OUTPUT_DIR):
+    """
+    Streams a PDF to disk and registers it in the manifest.
+    - Files already in the manifest are revalidated with a conditional request (ETag / Last-Modified).
+    - Files downloaded before the manifest existed are skipped as before.
+    - Content is written to a temporary '.part' file and atomically renamed when complete.
+    """
+    filepath = os.path.join(output_dir, filename)
+    entry = manifest.get(filename)
 
-    # Skip if already downloaded for future updates
-    if os.path.exists(filepath):
+    # Skip if already downloaded by a previous version of the crawler
+    if os.path.exists(filepath) and entry is None:
         print(f"[SKIP] Already exists: {filename}")
         return
 
+    conditional_headers = {}
+    if entry is not None and os.path.exists(filepath):
+        if entry.get("etag"):
+            conditional_headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            conditional_headers["If-Modified-Since"] = entry["last_modified"]
+
+    part_path = filepath + ".part"
     try:
-        response = requests.get(url, headers=HEADERS)
-        response.raise_for_status()
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
+        with fetch(session, limiter, url, headers=conditional_headers, stream=True) as response:
+            if response.status_code == 304:
+                print(f"[SKIP] Not modified: {filename}")
+                return
+            response.raise_for_status()
+
+            size = 0
+            with open(part_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    size += len(chunk)
+
+            os.replace(part_path, filepath)
+            manifest.update(filename, {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "size": size,
+            })
         print(f"[OK] Downloaded: {filename}")
-        time.sleep(0.5) # Trying to not get blocked
     except Exception as e:
+        # Never leave a half written file behind
+        if os.path.exists(part_path):
+            os.remove(part_path)
         print(f"[ERROR] Failed to download {url}: {e}")
 
 
-def get_pdf_from_press_conf_page(page_url):
+def get_pdf_from_press_conf_page(session, limiter, page_url):
     try:
         # Fetch and parse the press conference page
-        response = requests.get(page_url, headers=HEADERS)
+        response = fetch(session, limiter, page_url)
         soup = BeautifulSoup(response.content, 'html.parser')
-        
+
         links = soup.find_all('a', href=True)
         for link in links:
             href = link['href']
-            text = link.get_text().lower()
-            
+
             # Avoid minutes since they have a 3-week delay
             if '.pdf' in href and ('FOMCpresconf' in href):
                 return urljoin(page_url, href)
@@ -56,22 +175,27 @@ def get_pdf_from_press_conf_page(page_url):
         print(f"[ERROR] Error parsing page {page_url}: {e}")
         return None
 
-def process_calendar_page(url, year_context=None):
-    print(f"\nProcessing calendar: {url}")
+def process_calendar_page(session, limiter, url, year_context=None):
+    """
+    Parses a calendar page and returns the download jobs found in it.
+    Returns:
+        jobs (list): Tuples of (url, filename, is_pdf).
+    """
+    jobs = []
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = fetch(session, limiter, url)
         soup = BeautifulSoup(response.content, 'html.parser')
-        
+
         # Looking for links that say "Press Conference"
         links = soup.find_all('a', string=re.compile(r"Press Conference", re.I))
-        
+
         for i, link in enumerate(links):
             href = link['href']
             full_url = urljoin(url, href)
 
             # Try to extract date from URL
             date_match = re.search(r'(\d{8})', href)
-            
+
             if date_match:
                 date_str = date_match.group(1)
             elif year_context:
@@ -82,37 +206,61 @@ def process_calendar_page(url, year_context=None):
                 date_str = f"{year_context}_meeting_{i+1}"
             else:
                 # Timestamp to avoid collision
-                date_str = f"unknown_{int(time.time())}_{i}" 
+                date_str = f"unknown_{int(time.time())}_{i}"
 
             filename = f"{date_str}_PressConference.pdf"
-            if href.endswith('.pdf'):
-                download_pdf(full_url, filename)
-            else:
-                pdf_url = get_pdf_from_press_conf_page(full_url)
-                if pdf_url:
-                    download_pdf(pdf_url, filename)
-                else:
-                    print(f"[INFO] No PDF found inside {full_url}")
+            jobs.append((full_url, filename, href.endswith('.pdf')))
 
     except Exception as e:
         print(f"[ERROR] Error processing calendar {url}: {e}")
 
-def main():
-    setup_directory()
-        
-    start_year = 2011
-    current_year = 2025
-    
-    for year in range(start_year, current_year):
-        hist_url = f"https://www.federalreserve.gov/monetarypolicy/fomchistorical{year}.htm"
-        process_calendar_page(hist_url, year_context=year)
+    return jobs
+
+def process_job(session, limiter, manifest, job, output_dir=OUTPUT_DIR):
+    url, filename, is_pdf = job
+    if is_pdf:
+        download_pdf(session, limiter, manifest, url, filename, output_dir)
+        return
+
+    # Reuse the url stored in the manifest to avoid parsing the press conference page again
+    entry = manifest.get(filename)
+    pdf_url = entry["url"] if entry else get_pdf_from_press_conf_page(session, limiter, url)
+    if pdf_url:
+        download_pdf(session, limiter, manifest, pdf_url, filename, output_dir)
+    else:
+        print(f"[INFO] No PDF found inside {url}")
 
+def main(base_url=BASE_URL, output_dir=OUTPUT_DIR, start_year=2011, current_year=2025, max_workers=MAX_WORKERS):
+    setup_directory(output_dir)
 
-    # Current calendar
-    current_calendar = "https://www.federalreserve.gov/monetarypolicy/fomccalendars.htm"
+    session = create_session(max_workers)
+    limiter = HostRateLimiter()
+    manifest = Manifest(output_dir)
 
+    # Historical calendars + current calendar
     # Pass the current year as context in case of missing dates
-    process_calendar_page(current_calendar, year_context=current_year)  
+    calendars = [(f"{base_url}/monetarypolicy/fomchistorical{year}.htm", year) for year in range(start_year, current_year)]
+    calendars.append((f"{base_url}/monetarypolicy/fomccalendars.htm", current_year))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Collect every download job from the calendars
+        calendar_jobs = list(executor.map(lambda c: process_calendar_page(session, limiter, *c), calendars))
+        # Printed once every calendar is parsed, so the lines do not interleave between workers
+        for (url, _), page_jobs in zip(calendars, calendar_jobs):
+            print(f"\nProcessed calendar: {url} ({len(page_jobs)} press conferences)")
+        jobs = [job for page_jobs in calendar_jobs for job in page_jobs]
+        # A meeting listed on several calendars is downloaded once, two workers
+        # would otherwise write the same '.part' file at the same time
+        unique_jobs = {}
+        for job in jobs:
+            unique_jobs.setdefault(job[1], job)
+        unique_jobs = list(unique_jobs.values())
+        print(f"\nPress conferences found: {len(unique_jobs)} ({len(jobs) - len(unique_jobs)} duplicates)")
+
+        # Download the PDFs concurrently, list() propagates unexpected errors
+        list(executor.map(lambda job: process_job(session, limiter, manifest, job, output_dir), unique_jobs))
+
+    session.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
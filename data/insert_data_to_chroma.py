@@ -1,49 +1,90 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from chromadb import HttpClient
+# The model and database stacks are imported by the functions that use them,
+# so the worker processes of build_indexes.py only pay for what they run
 import joblib
-import torch
-
-# Initial setup
-print('-'*50)
-
-# Check for GPU availability
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
-print('-'*50)
-
-# Check if Chroma server is running and connect to it
-try:
-    client = HttpClient(host="http://localhost:8000")
-    print("Chroma server is running.")
-except Exception as e:
-    print("Chroma server is not running. Please start the server and try again.")
-    raise e
-
-print('-'*50)
-
-# Load cleaned documents
-documents = joblib.load('./clean/clean_documents.pkl')
-print(f"Number of documents loaded: {len(documents)}")
-print('-'*50)
-
-# Initialize embedding models
-
-# Model for semantic chunking (smaller model)
-chunk_embedding_model = HuggingFaceEmbeddings(
-    model_name="BAAI/bge-small-en-v1.5",
-    model_kwargs={'device': device},
-    encode_kwargs={'normalize_embeddings': True}
-)
-
-# Model for final embeddings (larger model)
-embedding_model = HuggingFaceEmbeddings(
-    model_name="BAAI/bge-large-en-v1.5",
-    model_kwargs={'device': device},
-    encode_kwargs={'normalize_embeddings': True}
-)
+import time
+
+from utils.dedup import deduplicate_chunks, date_range
+
+DOCUMENTS_FILE = './clean/clean_documents.pkl'
+
+# Percentile thresholds for semantic chunking
+THRESHOLDS = [50, 75, 90, 97.5]
+
+# Parameters for recursive character chunking
+CHUNK_SIZES = [500, 1000, 1500]
+OVERLAP_PERCENTAGES = [10, 15]
+
+# Suffix of the collections while they are being built
+BUILDING_SUFFIX = "__building"
+
+
+def get_device():
+    import torch
+
+    # Check for GPU availability
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Using device: {device}")
+    print('-'*50)
+    return device
+
+def connect_to_chroma():
+    from chromadb import HttpClient
+
+    # Check if Chroma server is running and connect to it
+    try:
+        client = HttpClient(host="http://localhost:8000")
+        print("Chroma server is running.")
+    except Exception as e:
+        print("Chroma server is not running. Please start the server and try again.")
+        raise e
+
+    print('-'*50)
+    return client
+
+def load_documents(documents_file=DOCUMENTS_FILE):
+    # Load cleaned documents
+    documents = joblib.load(documents_file)
+    print(f"Number of documents loaded: {len(documents)}")
+    print('-'*50)
+    return documents
+
+def load_embedding_models(device):
+    """
+    Returns:
+        chunk_embedding_model: Model for semantic chunking (smaller model).
+        embedding_model: Model for final embeddings (larger model).
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    chunk_embedding_model = HuggingFaceEmbeddings(
+        model_name="BAAI/bge-small-en-v1.5",
+        model_kwargs={'device': device},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+    embedding_model = HuggingFaceEmbeddings(
+        model_name="BAAI/bge-large-en-v1.5",
+        model_kwargs={'device': device},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    return chunk_embedding_model, embedding_model
+
+def config_grid():
+    """
+    Chunking configurations of the experiments, one collection each.
+    """
+    configs = [{"method": "semantic", "threshold": threshold} for threshold in THRESHOLDS]
+    configs += [
+        {"method": "recursive", "chunk_size": chunk_size, "overlap_percentage": overlap_percentage}
+        for chunk_size in CHUNK_SIZES
+        for overlap_percentage in OVERLAP_PERCENTAGES
+    ]
+    return configs
+
+def collection_name_from_config(config):
+    if config["method"] == "semantic":
+        return f"Semantic_chunker_{config['threshold']}th_percentile"
+    return f"Recursive_character_size-{config['chunk_size']}_overlap-{config['overlap_percentage']}"
 
 def semantic_chunk(documents, threshold, chunk_embedding_model):
     """
@@ -56,9 +97,11 @@ def semantic_chunk(documents, threshold, chunk_embedding_model):
         chunks (list): List of chunked documents.
         collection_name (str): Name for the Chroma collection.
     """
+    from langchain_experimental.text_splitter import SemanticChunker
+
     text_splitter = SemanticChunker(
         chunk_embedding_model,
-        breakpoint_threshold_type = "percentile", 
+        breakpoint_threshold_type = "percentile",
         breakpoint_threshold_amount = threshold,
         min_chunk_size = 100,
     )
@@ -67,7 +110,7 @@ def semantic_chunk(documents, threshold, chunk_embedding_model):
     print(f"Number of chunks: {len(chunks)}")
     print('-'*50)
 
-    collection_name = f"Semantic_chunker_{threshold}th_percentile"
+    collection_name = collection_name_from_config({"method": "semantic", "threshold": threshold})
 
     return chunks, collection_name
 
@@ -82,6 +125,8 @@ def recursive_chunk(documents, chunk_size, chunk_overlap_percentage):
         chunks (list): List of chunked documents.
         collection_name (str): Name for the Chroma collection.
     """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size = chunk_size,
         chunk_overlap = (chunk_size * chunk_overlap_percentage) // 100,
@@ -92,60 +137,112 @@ def recursive_chunk(documents, chunk_size, chunk_overlap_percentage):
     print(f"Number of chunks: {len(chunks)}")
     print('-'*50)
 
-    collection_name = f"Recursive_character_size-{chunk_size}_overlap-{chunk_overlap_percentage}"
+    collection_name = collection_name_from_config(
+        {"method": "recursive", "chunk_size": chunk_size, "overlap_percentage": chunk_overlap_percentage}
+    )
 
     return chunks, collection_name
 
+def collection_exists(client, collection_name):
+    collections = [col.name for col in client.list_collections()]
+    return collection_name in collections
+
 def insert_data_to_chroma(chunks, collection_name, embedding_model, client):
     """
     Insert chunked documents into Chroma collection in batches.
+    The collection is built under a temporary name and renamed when complete,
+    so it only becomes visible to readers once it is fully indexed.
     Args:
         chunks (list): List of chunked documents.
         collection_name (str): Name for the Chroma collection.
         embedding_model: Embedding model used for creating embeddings.
         client: Chroma client instance.
+    Returns:
+        inserted (bool): False if the collection already existed.
     """
-    collections = client.list_collections()
-    collections = [col.name for col in collections]
-
-    if collection_name in collections:
+    if collection_exists(client, collection_name):
         print(f"Collection '{collection_name}' already exists.")
-        return
-    
-    vectorstore = Chroma(client=client, 
-                     collection_name=collection_name, 
+        return False
+
+    from langchain_chroma import Chroma
+
+    # Remove the leftovers of an interrupted build
+    building_name = collection_name + BUILDING_SUFFIX
+    if collection_exists(client, building_name):
+        client.delete_collection(building_name)
+
+    vectorstore = Chroma(client=client,
+                     collection_name=building_name,
                      embedding_function=embedding_model)
-    
+
+    # Chroma only compares numbers: the dates of each chunk are also stored as YYYYMMDD integers,
+    # so the retrieval of a period can filter them in the search (chunks without a date have none)
+    for chunk in chunks:
+        dates = date_range(chunk.metadata)
+        if dates is not None:
+            chunk.metadata = {**chunk.metadata, "date_from": dates[0], "date_to": dates[1]}
+
     # The limit of chunks inserted at the same time is 5461
-    batch_size = 5460  
+    batch_size = 5460
 
     # Insert chunks in batches
     for i in range(0, len(chunks), batch_size):
         batch = chunks[i : i + batch_size]
         vectorstore.add_documents(batch)
 
+    # Make the collection visible
+    client.get_collection(building_name).modify(name=collection_name)
+
     print(f"{collection_name} has been indexed")
+    return True
 
-def main():
-    # Percentile thresholds for semantic chunking
-    thresholds = [50, 75, 90, 97.5] 
+def build_collection(config, documents, chunk_embedding_model, embedding_model, client):
+    """
+    Chunks the documents with one configuration of the grid and indexes them.
+    Returns:
+        stats (dict): Collection name, number of chunks, dedup ratio and chunking / indexing times.
+    """
+    collection_name = collection_name_from_config(config)
+    stats = {"collection_name": collection_name, "chunks": 0, "chunk_seconds": 0.0, "index_seconds": 0.0, "skipped": True}
 
-    # For each threshold, chunk documents and insert into Chroma
-    for threshold in thresholds:
-        chunks, collection_name = semantic_chunk(documents, threshold, chunk_embedding_model)
-        insert_data_to_chroma(chunks, collection_name, embedding_model, client)
-        print('='*50)
+    if collection_exists(client, collection_name):
+        print(f"Collection '{collection_name}' already exists.")
+        return stats
+
+    start = time.perf_counter()
+    if config["method"] == "semantic":
+        chunks, _ = semantic_chunk(documents, config["threshold"], chunk_embedding_model)
+    else:
+        chunks, _ = recursive_chunk(documents, config["chunk_size"], config["overlap_percentage"])
+
+    # Stock paragraphs repeated meeting after meeting are indexed once, with all their sources
+    chunks, dedup_stats = deduplicate_chunks(chunks)
+    stats.update(dedup_stats)
+    print(f"Near-duplicates removed: {dedup_stats['chunks_before_dedup'] - dedup_stats['chunks_after_dedup']} "
+          f"(dedup ratio {dedup_stats['dedup_ratio']:.1%})")
+    stats["chunk_seconds"] = time.perf_counter() - start
 
-    # Parameters for recursive character chunking
-    chunk_sizes = [500, 1000, 1500]
-    overlap_percentages = [10, 15]
+    start = time.perf_counter()
+    stats["skipped"] = not insert_data_to_chroma(chunks, collection_name, embedding_model, client)
+    stats["index_seconds"] = time.perf_counter() - start
+    stats["chunks"] = len(chunks)
 
-    # For each combination of chunk size and overlap percentage, chunk documents and insert into Chroma
-    for chunk_size in chunk_sizes:
-        for overlap_percentage in overlap_percentages:
-            chunks, collection_name = recursive_chunk(documents, chunk_size, overlap_percentage)
-            insert_data_to_chroma(chunks, collection_name, embedding_model, client)
-            print('='*50)
+    return stats
+
+def main():
+    # Initial setup
+    print('-'*50)
+    device = get_device()
+    client = connect_to_chroma()
+    documents = load_documents()
+
+    # Initialize embedding models
+    chunk_embedding_model, embedding_model = load_embedding_models(device)
+
+    # For each configuration, chunk documents and insert into Chroma
+    for config in config_grid():
+        build_collection(config, documents, chunk_embedding_model, embedding_model, client)
+        print('='*50)
 
     # List all collections in Chroma and their size after insertion
     print("Collections completed:")
@@ -155,4 +252,4 @@ def main():
     print("-"*51)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,79 @@
+from chromadb import HttpClient
+import json
+import os
+
+from utils.local_index import LocalIndex, export_collection, sample_query_vectors, evaluate_recall
+from utils.quantize import QuantizedIndex, PerVectorInt8Index, build_quantized_index, QUANTIZATION_TYPES
+
+INDEX_DIR = "indexes"
+COLLECTION_NAME = "Recursive_character_size-1500_overlap-15"
+K_VALUES = [10, 20, 50]
+N_QUERIES = 200
+REPORT_FILE = "quantization_report.json"
+
+
+def main(collection_name=COLLECTION_NAME):
+    index_dir = os.path.join(INDEX_DIR, collection_name)
+
+    # Export the collection from Chroma only once
+    if not os.path.exists(index_dir):
+        try:
+            client = HttpClient(host="http://localhost:8000")
+            print("Chroma server is running.")
+        except Exception as e:
+            print("Chroma server is not running. Please start the server and try again.")
+            raise e
+        export_collection(client, collection_name, index_dir)
+    print('-'*50)
+
+    baseline = LocalIndex(index_dir)
+    # Sample stored chunks to use their vectors as queries
+    query_vectors = sample_query_vectors(baseline, N_QUERIES)
+
+    report = {"collection_name": collection_name, "float32_bytes": baseline.memory_bytes(), "results": []}
+    print(f"float32 vectors: {baseline.memory_bytes() / 2**20:.1f} MB")
+    # Exact search latency of each k, the reference of the speedups
+    exact_latency_ms = {}
+    for k in K_VALUES:
+        _, latency_ms = evaluate_recall(baseline, baseline, query_vectors, k)
+        exact_latency_ms[k] = latency_ms
+        report["results"].append({"dtype": "float32", "k": k, "rescore": False, "bytes": baseline.memory_bytes(),
+                                  "memory_saved": 0.0, "recall": 1.0, "recall_delta": 0.0, "latency_ms": latency_ms,
+                                  "speedup": 1.0})
+        print(f" k={k:<3} exact search latency={latency_ms:.2f} ms")
+    print('-'*50)
+
+    # Served schemes, then int8 with one scale per vector for reference
+    for dtype in QUANTIZATION_TYPES + ["int8_per_vector"]:
+        if dtype == "int8_per_vector":
+            index = PerVectorInt8Index(index_dir)
+        else:
+            build_quantized_index(index_dir, dtype)
+            index = QuantizedIndex(index_dir, dtype=dtype)
+        saved = 1 - index.memory_bytes() / baseline.memory_bytes()
+        print(f"{dtype} codes: {index.memory_bytes() / 2**20:.1f} MB ({saved:.1%} saved)")
+
+        for k in K_VALUES:
+            for rescore in [False, True]:
+                recall, latency_ms = evaluate_recall(index, baseline, query_vectors, k, rescore=rescore)
+                report["results"].append({
+                    "dtype": dtype,
+                    "k": k,
+                    "rescore": rescore,
+                    "bytes": index.memory_bytes(),
+                    "memory_saved": saved,
+                    "recall": recall,
+                    "recall_delta": recall - 1.0,
+                    "latency_ms": latency_ms,
+                    "speedup": exact_latency_ms[k] / latency_ms,
+                })
+                print(f" k={k:<3} rescore={str(rescore):<5} recall={recall:.4f} (delta {recall - 1.0:+.4f}) "
+                      f"latency={latency_ms:.2f} ms ({exact_latency_ms[k] / latency_ms:.1f}x exact)")
+        print('-'*50)
+
+    with open(os.path.join(index_dir, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to '{index_dir}/{REPORT_FILE}'")
+
+if __name__ == "__main__":
+    main()
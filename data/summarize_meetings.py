@@ -0,0 +1,84 @@
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from collections import defaultdict
+import joblib
+import time
+import os
+
+from utils.llms import load_model
+from utils.prompts import get_meeting_summary_prompt
+from utils.format import parse_with_fixer
+from utils.meetings import connect, meeting_exists, save_meeting, MEETINGS_DB
+
+INPUT_FILE = os.path.join("clean", "clean_documents.pkl")
+# Same table as the engine reads, whatever the working directory
+DB_PATH = MEETINGS_DB
+
+# Transcript characters sent to the LLM, the opening statement comes first
+MAX_CHARS = 40000
+# Same pacing as the experiments to stay under the groq token limits
+MIN_SECONDS_PER_CALL = 31
+
+
+def group_by_meeting(documents):
+    """
+    Groups the cleaned pages by meeting (the date of the PDF, the same date shown in the fragment headers).
+    Returns:
+        meetings (dict): date -> pages sorted by page number.
+    """
+    meetings = defaultdict(list)
+    for doc in documents:
+        date = str(doc.metadata.get('creationdate', 'Unknown Date'))[:10]
+        meetings[date].append(doc)
+
+    return {date: sorted(pages, key=lambda doc: doc.metadata.get('page', 0)) for date, pages in sorted(meetings.items())}
+
+def main(input_file=INPUT_FILE, db_path=DB_PATH):
+    documents = joblib.load(input_file)
+    meetings = group_by_meeting(documents)
+    print(f"Number of meetings found: {len(meetings)}")
+    print('-'*50)
+
+    llm = load_model()
+    chain = (
+        get_meeting_summary_prompt()
+        | llm.bind(stop=["Human:", "System:"])
+        | StrOutputParser()
+        | RunnableLambda(parse_with_fixer)
+    )
+
+    conn = connect(db_path)
+    for date, pages in meetings.items():
+        # Built once per meeting, only new meetings are summarized
+        if meeting_exists(conn, date):
+            print(f"[SKIP] Already summarized: {date}")
+            continue
+
+        start = time.time()
+        transcript = "\n".join(page.page_content for page in pages)[:MAX_CHARS]
+        try:
+            result = chain.invoke({"date": date, "transcript": transcript})
+            save_meeting(
+                conn,
+                date,
+                sentiment=str(result.get("Sentiment", "Unknown")),
+                summary=str(result.get("Summary", "")),
+                key_quotes=[str(quote) for quote in result.get("Key Quotes", [])],
+                total_pages=len(pages),
+                model=llm.model_name
+            )
+            print(f"[OK] {date}: {result.get('Sentiment')}")
+        except Exception as e:
+            print(f"[ERROR] Failed to summarize {date}: {e}")
+
+        duration = time.time() - start
+        if duration < MIN_SECONDS_PER_CALL:
+            time.sleep(MIN_SECONDS_PER_CALL - duration)
+
+    total = conn.execute("SELECT COUNT(*) FROM meetings").fetchone()[0]
+    conn.close()
+    print('-'*50)
+    print(f"Meetings summarized: {total}. Table saved to '{db_path}'")
+
+if __name__ == "__main__":
+    main()
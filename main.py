@@ -1,47 +1,78 @@
-from src.rag import rag
+from utils.engine import RAGEngine, DEFAULT_COLLECTION
+from utils.format import ANSWER_KEY, SENTIMENT_KEY, format_sentiment
 import gradio as gr
+import os
 
-def generate_response(query):
+# Collections preloaded next to the default one, e.g. "Semantic_chunker_75th_percentile,Recursive_character_size-1000_overlap-10"
+SERVING_COLLECTIONS = [name for name in os.getenv("SERVING_COLLECTIONS", "").split(",") if name]
+# Candidate collection compared in the background with the served one
+SHADOW_COLLECTION = os.getenv("SHADOW_COLLECTION") or None
+
+# Long-lived engine shared by every request (models are loaded once)
+engine = None
+
+def get_engine():
+    global engine
+    if engine is None:
+        engine = RAGEngine(
+            collection_names=SERVING_COLLECTIONS,
+            default_collection=DEFAULT_COLLECTION,
+            shadow_collection=SHADOW_COLLECTION,
+            micro_batch=True
+        )
+    return engine
+
+def generate_response(query, collection_name=None, session_id=None):
     """
     Invokes the RAG pipeline to get a structured response.
+    Questions of the same session can follow up on the previous ones ("and what about June?").
     """
-    generated_answer = rag(query)
+    generated_answer = get_engine().answer(query, collection_name=collection_name, session_id=session_id)
     return generated_answer
 
 def get_field(generated_answer, field_name: str) -> str:
     """
-    Extracts specific fields (Answer, Sentiment, Evidence) from the 
-    JSON returned by the LLM.
+    Extracts specific fields (Answer, Sentiment, Evidence) from the
+    typed response returned by the RAG chain.
     """
-    keys = generated_answer.keys()
-    # Search for keys that contain the field name (case-insensitive)
-    answer_keys = [k for k in keys if field_name.lower() in k.lower()]
+    value = generated_answer.get(field_name)
 
-    if not answer_keys:
+    if field_name == SENTIMENT_KEY:
+        return format_sentiment(value)
+    if not value:
         return "Information not found in the context."
-    elif len(answer_keys) == 1:
-        return str(generated_answer[answer_keys[0]])
-    else:
-        # Concatenate multiple matches if they exist
-        return "\n".join([str(generated_answer[k]) for k in answer_keys])
+    if isinstance(value, list):
+        return "\n".join(str(item) for item in value)
+    return str(value)
 
-def pipeline(query):
+def pipeline(query, collection_name=None, request: gr.Request = None):
     """
     Orchestrates the retrieval and formatting for the Gradio UI.
     Returns: (Sentiment, Answer)
     """
     try:
         # Generate the raw JSON response from the RAG chain
-        raw_output = generate_response(query)
+        # The default collection is resolved per request, so a hot-swap applies immediately
+        if collection_name == get_engine().default_collection:
+            collection_name = None
+        # Each browser tab is a session, its previous retrieval is reused by follow-ups
+        session_id = request.session_hash if request else None
+        raw_output = generate_response(query, collection_name, session_id)
         
         # Extract Sentiment and Answer fields
-        sentiment = get_field(raw_output, "Sentiment")
-        answer = get_field(raw_output, "Answer")
+        sentiment = get_field(raw_output, SENTIMENT_KEY)
+        answer = get_field(raw_output, ANSWER_KEY)
         
         return sentiment, answer
     except Exception as e:
         return f"Error processing the query: {e}"
 
+def end_session(request: gr.Request):
+    """
+    Frees the retrieval state of a session when its tab is closed.
+    """
+    get_engine().sessions.pop(request.session_hash)
+
 def launch_interface():
     """
     Launches the Gradio interface.
@@ -62,6 +93,12 @@ def launch_interface():
             lines=3
         )
 
+        collection_input = gr.Dropdown(
+            label="Chunking configuration",
+            choices=get_engine().collection_names,
+            value=get_engine().default_collection
+        )
+
         # Outputs
         sentiment_output = gr.Textbox(
             label="Sentiment",
@@ -80,10 +117,13 @@ def launch_interface():
 
         submit_btn.click(
             fn=pipeline,
-            inputs=query_input,
+            inputs=[query_input, collection_input],
             outputs=[sentiment_output, answer_output]
         )
 
+        # Idle sessions are also evicted by the engine after SESSION_IDLE_SECONDS
+        demo.unload(end_session)
+
     demo.launch()
 
 
@@ -0,0 +1,228 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+import threading
+import asyncio
+import queue
+import json
+import time
+import os
+
+from utils.engine import RAGEngine, DEFAULT_COLLECTION
+from utils.format import parse_response
+from utils.llms import load_model
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", 8080))
+# Seconds before a request is answered with a 504 (also the timeout of the LLM calls)
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", 60))
+# Keep-alive connections to the Groq API shared by the concurrent requests
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+# Most fragments a /retrieve request can ask for
+MAX_K = int(os.getenv("API_MAX_K", 50))
+
+# Same serving options as the UI (see main.py)
+SERVING_COLLECTIONS = [name for name in os.getenv("SERVING_COLLECTIONS", "").split(",") if name]
+SHADOW_COLLECTION = os.getenv("SHADOW_COLLECTION") or None
+
+
+class RetrieveRequest(BaseModel):
+    question: str
+    # Collection to search, the default one if not given
+    collection: str | None = None
+    # Fragments returned, the engine's k if not given
+    k: int | None = Field(default=None, ge=1, le=MAX_K)
+
+
+class AnswerRequest(BaseModel):
+    question: str
+    collection: str | None = None
+    # Conversation of the question, follow-ups reuse the previous retrieval of the session
+    session_id: str | None = None
+
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+def serialize_docs(docs):
+    return [
+        {
+            "id": doc.id,
+            "content": doc.page_content,
+            "metadata": doc.metadata,
+            "score": getattr(doc, "score", None),
+        }
+        for doc in docs
+    ]
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def build_context(engine, request):
+    """
+    Retrieval stage of an answer.
+    Returns:
+        question (str): Question sent to the LLM (stand-alone version of a follow-up).
+        context (str): Context of the question.
+    """
+    if request.session_id:
+        return engine.session_context(request.question, request.session_id, request.collection)
+    meetings = engine.get_meetings(request.question)
+    docs = engine.retrieve(request.question, request.collection, meetings=meetings)
+    return request.question, engine.build_context(docs, meetings)
+
+def run_retrieve(engine, request):
+    start = time.perf_counter()
+    docs = engine.retrieve(request.question, request.collection, k=request.k)
+    timings = {"retrieve": elapsed_ms(start)}
+    return {
+        "question": request.question,
+        "collection": request.collection or engine.default_collection,
+        "fragments": serialize_docs(docs),
+        "timings_ms": timings,
+    }
+
+def run_answer(engine, request):
+    timings = {}
+    start = time.perf_counter()
+    question, context = build_context(engine, request)
+    timings["retrieve"] = elapsed_ms(start)
+
+    stage = time.perf_counter()
+    text = engine.generation_chain().invoke({"context": context, "question": question})
+    timings["generate"] = elapsed_ms(stage)
+
+    stage = time.perf_counter()
+    answer = parse_response(text)
+    timings["parse"] = elapsed_ms(stage)
+    timings["total"] = elapsed_ms(start)
+    return {"question": question, "answer": answer, "timings_ms": timings}
+
+def stream_answer(engine, request, timeout):
+    """
+    Server-sent events of an answer: "context" once retrieved, one "token" per generated
+    chunk, then the parsed "answer" with the timings (or an "error").
+    Retrieval and generation run in a worker thread, so the deadline also cuts off a slow
+    retrieval or a first token that never comes.
+    """
+    start = time.perf_counter()
+    deadline = start + timeout
+    events = queue.Queue()
+    # Stops the generation once nobody reads it (deadline reached or client gone)
+    cancelled = threading.Event()
+
+    def produce():
+        try:
+            question, context = build_context(engine, request)
+            events.put(("context", question))
+            for chunk in engine.generation_chain().stream({"context": context, "question": question}):
+                if cancelled.is_set():
+                    return
+                events.put(("token", chunk))
+            events.put(("done", None))
+        except Exception as e:
+            events.put(("error", str(e)))
+
+    threading.Thread(target=produce, daemon=True).start()
+    timings = {}
+    chunks = []
+    try:
+        while True:
+            try:
+                kind, data = events.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                yield sse_event("error", {"detail": f"Request timed out after {timeout:g} s"})
+                return
+            if kind == "context":
+                timings["retrieve"] = elapsed_ms(start)
+                stage = time.perf_counter()
+                yield sse_event("context", {"question": data, "timings_ms": dict(timings)})
+            elif kind == "token":
+                if not chunks:
+                    timings["first_token"] = elapsed_ms(start)
+                chunks.append(data)
+                yield sse_event("token", {"text": data})
+            elif kind == "error":
+                # The status code is already sent, errors are reported as an event
+                yield sse_event("error", {"detail": data})
+                return
+            else:
+                break
+        timings["generate"] = elapsed_ms(stage)
+
+        stage = time.perf_counter()
+        answer = parse_response("".join(chunks))
+        timings["parse"] = elapsed_ms(stage)
+        timings["total"] = elapsed_ms(start)
+        yield sse_event("answer", {"answer": answer, "timings_ms": timings})
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
+    finally:
+        cancelled.set()
+
+
+def create_app(engine, timeout=REQUEST_TIMEOUT_SECONDS):
+    """
+    HTTP API over a long-lived RAGEngine.
+    The engine holds the pooled backends (one Chroma client or in-process local index,
+    one embedding model, one LLM client) shared by every request. Requests run in worker
+    threads, so the engine must already be built, e.g. with in-process stand-ins for tests.
+    Args:
+        engine (RAGEngine): Serving engine.
+        timeout (float): Seconds before a request is answered with a 504.
+    """
+    app = FastAPI(title="FED sentiment analysis with RAG")
+
+    def check_collection(name):
+        if name and name not in engine.collection_names:
+            raise HTTPException(status_code=404, detail=f"Collection '{name}' is not loaded. Loaded collections: {engine.collection_names}")
+
+    async def with_timeout(function, request):
+        check_collection(request.collection)
+        try:
+            # The worker thread is not interrupted, the LLM call has its own timeout
+            return await asyncio.wait_for(run_in_threadpool(function, engine, request), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"Request timed out after {timeout:g} s")
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "default_collection": engine.default_collection, "collections": engine.collection_names}
+
+    @app.post("/retrieve")
+    async def retrieve(request: RetrieveRequest):
+        return await with_timeout(run_retrieve, request)
+
+    @app.post("/answer")
+    async def answer(request: AnswerRequest):
+        return await with_timeout(run_answer, request)
+
+    @app.post("/answer/stream")
+    def answer_stream(request: AnswerRequest):
+        check_collection(request.collection)
+        return StreamingResponse(stream_answer(engine, request, timeout), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    print('-'*50)
+    engine = RAGEngine(
+        collection_names=SERVING_COLLECTIONS,
+        default_collection=DEFAULT_COLLECTION,
+        shadow_collection=SHADOW_COLLECTION,
+        llm=load_model(timeout=REQUEST_TIMEOUT_SECONDS, max_connections=LLM_MAX_CONNECTIONS),
+        micro_batch=True
+    )
+    try:
+        print(f"API listening on http://{API_HOST}:{API_PORT}")
+        print('-'*50)
+        uvicorn.run(create_app(engine), host=API_HOST, port=API_PORT)
+    finally:
+        engine.close()
+
+if __name__ == "__main__":
+    main()
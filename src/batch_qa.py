@@ -0,0 +1,217 @@
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import threading
+import math
+import json
+import time
+import sys
+import os
+
+from utils.engine import DEFAULT_COLLECTION, DEFAULT_K, AGGREGATE_K, INDEX_DIR
+from utils.llms import load_model, load_embedding_model, get_device, QUERY_ENCODER_MODE
+from utils.local_index import LocalIndex, export_collection
+from utils.meetings import meetings_for_question, format_meetings
+from utils.planner import plan_query, merge_results, OVERFETCH
+from utils.sections import chair_sections_filter
+from utils.format import parse_response, format_docs
+from utils.prompts import get_system_prompt
+
+# Input questions, one JSON object per line: {"id": ..., "question": ..., "collection": ...}
+# ("id" defaults to the line number and "collection" to the default collection)
+INPUT_FILE = sys.argv[1] if len(sys.argv) > 1 else "questions.jsonl"
+# .jsonl or .parquet, answers are checkpointed to a .jsonl file in both cases
+OUTPUT_FILE = sys.argv[2] if len(sys.argv) > 2 else "answers.jsonl"
+
+# Groq limits the requests per minute of the account
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 30))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4))
+
+# Same MMR parameters as the serving engine
+FETCH_FACTOR = 5
+LAMBDA_MULT = 0.7
+
+
+class RateLimiter:
+    """
+    Spaces the LLM calls of all the worker threads to at most `requests_per_minute`.
+    """
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE):
+        self.min_interval = 60 / requests_per_minute
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        # Reserve the next free slot, then sleep outside the lock
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def read_questions(path):
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            questions.append({
+                "id": str(record.get("id", line_number)),
+                "question": record["question"],
+                "collection": record.get("collection") or DEFAULT_COLLECTION,
+            })
+    return questions
+
+def checkpoint_path(output_file):
+    return os.path.splitext(output_file)[0] + ".jsonl"
+
+def load_done_ids(path):
+    """
+    Ids already answered by a previous (possibly crashed) run.
+    A last line cut by a crash is removed, so its question is answered again.
+    """
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+    done = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                done.add(json.loads(line)["id"])
+    return done
+
+def open_index(collection_name):
+    index_dir = os.path.join(INDEX_DIR, collection_name)
+    # Export the collection from Chroma only once
+    if not os.path.exists(index_dir):
+        from chromadb import HttpClient
+
+        export_collection(HttpClient(host="http://localhost:8000"), collection_name, index_dir)
+    return LocalIndex(index_dir)
+
+def retrieve_batch(questions, index, embedding_model):
+    """
+    Retrieves the fragments of all the questions of a collection at once.
+    Every question (or sub-query of a multi-period question) is embedded in one batched
+    encoder pass, then the MMR searches run vectorized, grouped by number of fragments.
+    Returns:
+        contexts (list): Context string of each question.
+    """
+    # Search requests: (question position, sub-query, number of fragments, sections)
+    plans, requests = [], []
+    for position, item in enumerate(questions):
+        meetings = meetings_for_question(item["question"])
+        n_docs = AGGREGATE_K if meetings else DEFAULT_K
+        sub_queries = plan_query(item["question"])
+        plans.append((meetings, sub_queries, n_docs))
+        k = n_docs if len(sub_queries) == 1 else math.ceil(n_docs / len(sub_queries)) * OVERFETCH
+        # Official-sentiment questions only search the Chair's text, like the serving engine
+        sections = chair_sections_filter(item["question"]) if index.store.has_sections else None
+        requests.extend((position, sub_query, k, tuple(sections or ())) for sub_query in sub_queries)
+
+    start = time.perf_counter()
+    query_vectors = np.asarray(embedding_model.embed_documents([request[1].query for request in requests]), dtype=np.float32)
+    print(f"{len(requests)} queries embedded in {time.perf_counter() - start:.1f} s")
+
+    start = time.perf_counter()
+    results = [None] * len(requests)
+    for k, sections in sorted({request[2:] for request in requests}):
+        group = [i for i, request in enumerate(requests) if request[2:] == (k, sections)]
+        subset = index.store.filter_positions(list(sections)) if sections else None
+        positions, scores = index.mmr_batch(query_vectors[group], k, k * FETCH_FACTOR, LAMBDA_MULT, subset=subset)
+        for i, row_positions, row_scores in zip(group, positions, scores):
+            results[i] = index.get_documents(row_positions, row_scores)
+    print(f"{len(requests)} MMR searches in {time.perf_counter() - start:.2f} s")
+
+    question_results = [[] for _ in plans]
+    for (position, *_), docs in zip(requests, results):
+        question_results[position].append(docs)
+
+    contexts = []
+    for (meetings, sub_queries, n_docs), docs in zip(plans, question_results):
+        docs = docs[0] if len(sub_queries) == 1 else merge_results(sub_queries, docs, n_docs)
+        context = format_docs(docs)
+        if meetings:
+            context = format_meetings(meetings) + "\n\n" + context
+        contexts.append(context)
+    return contexts
+
+def write_parquet(jsonl_path, parquet_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        # Per-period sentiments are dicts, kept as JSON in a string column
+        if isinstance(record.get("Sentiment"), dict):
+            record["Sentiment"] = json.dumps(record["Sentiment"])
+    pq.write_table(pa.Table.from_pylist(records), parquet_path)
+    print(f"{len(records)} answers saved to '{parquet_path}'")
+
+def main(input_file=INPUT_FILE, output_file=OUTPUT_FILE):
+    print('-'*50)
+    questions = read_questions(input_file)
+    checkpoint = checkpoint_path(output_file)
+    done = load_done_ids(checkpoint)
+    pending = [item for item in questions if item["id"] not in done]
+    print(f"{len(questions)} questions, {len(done)} already answered, {len(pending)} pending")
+    print('-'*50)
+
+    if pending:
+        device = "cpu" if QUERY_ENCODER_MODE != "torch" else get_device()
+        embedding_model = load_embedding_model(device=device, mode=QUERY_ENCODER_MODE)
+        rag_chain = (
+            get_system_prompt()
+            | load_model().bind(stop=["Human:", "System:"])
+            | StrOutputParser()
+            | RunnableLambda(parse_response)
+        )
+        limiter = RateLimiter()
+
+        def generate(item, context):
+            limiter.wait()
+            return rag_chain.invoke({"context": context, "question": item["question"]})
+
+        failed = 0
+        with open(checkpoint, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=LLM_CONCURRENCY) as executor:
+            for collection_name in dict.fromkeys(item["collection"] for item in pending):
+                group = [item for item in pending if item["collection"] == collection_name]
+                print(f"Collection '{collection_name}': {len(group)} questions")
+                contexts = retrieve_batch(group, open_index(collection_name), embedding_model)
+
+                futures = {executor.submit(generate, item, context): item for item, context in zip(group, contexts)}
+                for future in as_completed(futures):
+                    item = futures[future]
+                    try:
+                        answer = future.result()
+                    except Exception as e:
+                        # Not checkpointed, so the next run retries it
+                        failed += 1
+                        print(f"[ERROR] Question {item['id']}: {e}")
+                        continue
+                    out.write(json.dumps({**item, **answer}, ensure_ascii=False) + "\n")
+                    # Each answer is on disk before the next one, a crash loses at most the calls in flight
+                    out.flush()
+                    os.fsync(out.fileno())
+                print('-'*50)
+
+        print(f"Answered {len(pending) - failed} questions, {failed} failed (run again to retry them)")
+
+    if output_file.endswith(".parquet"):
+        write_parquet(checkpoint, output_file)
+    else:
+        print(f"Answers saved to '{checkpoint}'")
+
+if __name__ == "__main__":
+    main()
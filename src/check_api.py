@@ -0,0 +1,145 @@
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from fastapi.testclient import TestClient
+import numpy as np
+import tempfile
+import time
+import json
+import zlib
+import os
+
+from api import create_app, MAX_K
+from utils.engine import RAGEngine, INDEX_DIR
+from utils.fake_llm import FAKE_RESPONSE
+from utils.text_store import build_text_store
+from utils.local_index import VECTORS_FILE
+
+COLLECTION = "Check_collection"
+DIMENSION = 32
+N_FRAGMENTS = 300
+# Deadline of the checked app, slow stages last longer
+TIMEOUT_SECONDS = 1.0
+SLOW_SECONDS = 3.0
+
+
+class FakeEmbeddings:
+    """
+    Deterministic stand-in of the embedding model, `delay` seconds per query.
+    """
+    def __init__(self):
+        self.delay = 0.0
+
+    def embed_query(self, text):
+        time.sleep(self.delay)
+        vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).normal(size=DIMENSION)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def build_local_index():
+    """
+    Local index of fake fragments, one meeting per month from 2012, under INDEX_DIR.
+    """
+    index_dir = os.path.join(INDEX_DIR, COLLECTION)
+    os.makedirs(index_dir, exist_ok=True)
+    vectors = np.random.default_rng(0).normal(size=(N_FRAGMENTS, DIMENSION)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.save(os.path.join(index_dir, VECTORS_FILE), vectors)
+
+    ids = [str(i) for i in range(N_FRAGMENTS)]
+    texts = [f"Fragment {i} of the press conference on inflation and the labor market." for i in range(N_FRAGMENTS)]
+    metadatas = [
+        {"creationdate": f"{2012 + i // 24}-{1 + (i // 2) % 12:02d}-15T00:00:00", "page": i % 20 + 1, "total_pages": 20}
+        for i in range(N_FRAGMENTS)
+    ]
+    build_text_store(index_dir, ids, texts, metadatas)
+
+def read_events(response):
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def check_endpoints(client):
+    response = client.get("/health")
+    assert response.status_code == 200 and response.json()["collections"] == [COLLECTION], response.text
+
+    response = client.post("/retrieve", json={"question": "What did the Chair say about inflation?", "k": 3})
+    assert response.status_code == 200, response.text
+    assert len(response.json()["fragments"]) == 3, response.json()
+
+    for k in [0, MAX_K + 1]:
+        response = client.post("/retrieve", json={"question": "What did the Chair say about inflation?", "k": k})
+        assert response.status_code == 422, f"k={k} accepted: {response.status_code}"
+
+    response = client.post("/retrieve", json={"question": "Inflation?", "collection": "Unknown_collection"})
+    assert response.status_code == 404, response.text
+
+    response = client.post("/answer", json={"question": "What did the Chair say about inflation in 2015?", "session_id": "check"})
+    assert response.status_code == 200, response.text
+    assert response.json()["answer"]["Sentiment"] == "Neutral", response.json()
+
+    # Follow-up of the session, rewritten with its new period
+    response = client.post("/answer", json={"question": "And in 2016?", "session_id": "check"})
+    assert response.status_code == 200, response.text
+    assert response.json()["question"] == "What did the Chair say about inflation in 2016?", response.json()
+
+    response = client.post("/answer/stream", json={"question": "What did the Chair say about the labor market?"})
+    events = read_events(response)
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] == "context" and kinds[-1] == "answer" and "token" in kinds, kinds
+    assert "".join(data["text"] for kind, data in events if kind == "token") == FAKE_RESPONSE
+
+def check_timeouts(client, engine):
+    # Slow retrieval
+    engine.embedding_model.delay = SLOW_SECONDS
+    response = client.post("/answer", json={"question": "What did the Chair say about wages?"})
+    assert response.status_code == 504, response.text
+
+    start = time.perf_counter()
+    response = client.post("/answer/stream", json={"question": "What did the Chair say about productivity?"})
+    assert read_events(response) == [("error", {"detail": f"Request timed out after {TIMEOUT_SECONDS:g} s"})], response.text
+    assert time.perf_counter() - start < SLOW_SECONDS, "The stream waited for the retrieval"
+    engine.embedding_model.delay = 0.0
+
+    # First token that never comes
+    llm = engine.llm
+    engine.llm = FakeListChatModel(responses=[FAKE_RESPONSE], sleep=SLOW_SECONDS)
+    start = time.perf_counter()
+    response = client.post("/answer/stream", json={"question": "What did the Chair say about the balance sheet?"})
+    kinds = [kind for kind, _ in read_events(response)]
+    assert kinds == ["context", "error"], kinds
+    assert time.perf_counter() - start < SLOW_SECONDS, "The stream waited for the first token"
+    engine.llm = llm
+
+def main():
+    print('-'*50)
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The engine reads the local indexes from INDEX_DIR, relative to the working directory
+        os.chdir(work_dir)
+        build_local_index()
+        engine = RAGEngine(
+            collection_names=[COLLECTION],
+            default_collection=COLLECTION,
+            quantization="int8",
+            meeting_summaries=False,
+            embedding_model=FakeEmbeddings(),
+            llm=FakeListChatModel(responses=[FAKE_RESPONSE]),
+        )
+        client = TestClient(create_app(engine, timeout=TIMEOUT_SECONDS))
+
+        check_endpoints(client)
+        print('-'*50)
+        print("Endpoints: retrieval, bounds of k, unknown collection, answers, follow-ups and streaming")
+        check_timeouts(client, engine)
+        print('-'*50)
+        print("Timeouts: slow retrieval and stalled first token cut off at the deadline")
+
+        engine.close()
+    print('-'*50)
+    print("API checks passed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+from utils.planner import plan_query
+
+# Question -> expected (query, start_date, end_date) of its sub-queries
+CASES = {
+    # Compared entities share the predicate of the question
+    "Bernanke versus Powell on inflation": [
+        ("Bernanke on inflation", None, None),
+        ("Powell on inflation", None, None),
+    ],
+    "What did Bernanke say about inflation vs Powell?": [
+        ("What did Bernanke say about inflation?", None, None),
+        ("What did Powell say about inflation?", None, None),
+    ],
+    "How did Janet Yellen describe inflation compared to Jerome Powell?": [
+        ("How did Janet Yellen describe inflation?", None, None),
+        ("How did Jerome Powell describe inflation?", None, None),
+    ],
+    "What was said about inflation vs unemployment?": [
+        ("What was said about inflation?", None, None),
+        ("What was said about unemployment?", None, None),
+    ],
+    # Compared periods keep no connector of the other period
+    "2008 vs 2020 inflation": [
+        ("2008 inflation", "2008-01-01", "2008-12-31"),
+        ("2020 inflation", "2020-01-01", "2020-12-31"),
+    ],
+    "What happened in 2012 and 2015?": [
+        ("What happened in 2012?", "2012-01-01", "2012-12-31"),
+        ("What happened in 2015?", "2015-01-01", "2015-12-31"),
+    ],
+    "What happened in 2012, 2015 and 2019?": [
+        ("What happened in 2012?", "2012-01-01", "2012-12-31"),
+        ("What happened in 2015?", "2015-01-01", "2015-12-31"),
+        ("What happened in 2019?", "2019-01-01", "2019-12-31"),
+    ],
+    "Inflation in 2008 compared to 2020": [
+        ("Inflation in 2008", "2008-01-01", "2008-12-31"),
+        ("Inflation in 2020", "2020-01-01", "2020-12-31"),
+    ],
+    # Ranges and periods that follow each other are one search
+    "What was the sentiment from 2015 to 2018?": [
+        ("What was the sentiment from 2015 to 2018?", None, None),
+    ],
+    "What happened in 2008 and 2009?": [
+        ("What happened in 2008 and 2009?", None, None),
+    ],
+}
+
+
+def main():
+    print('-'*50)
+    for question, expected in CASES.items():
+        sub_queries = [(sub_query.query, sub_query.start_date, sub_query.end_date) for sub_query in plan_query(question)]
+        assert sub_queries == expected, f"{question}\n  got:      {sub_queries}\n  expected: {expected}"
+        print(f"{question} -> {[query for query, _, _ in sub_queries]}")
+    print('-'*50)
+    print("Planner checks passed")
+
+if __name__ == "__main__":
+    main()
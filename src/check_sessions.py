@@ -0,0 +1,75 @@
+from utils.sessions import SessionState, plan_follow_up
+
+
+def check_follow_up(state, question, **expected):
+    follow_up = plan_follow_up(state, question)
+    assert follow_up is not None, f"{question} is not read as a follow-up"
+    for name, value in expected.items():
+        got = getattr(follow_up, name)
+        if name == "sub_queries" and got is not None:
+            got = [(sub_query.query, sub_query.start_date, sub_query.end_date) for sub_query in got]
+        assert got == value, f"{question}\n  {name}: {got}\n  expected: {value}"
+    print(f"{state.question} + {question} -> {follow_up.query}")
+    if not follow_up.elaboration:
+        state.ask(follow_up)
+    return follow_up
+
+def main():
+    print('-'*50)
+    # New subject and new period: the subject is searched in the period
+    state = SessionState.start("What was the sentiment of the June 2024 press conference?", "check")
+    check_follow_up(
+        state, "and what about inflation in June?",
+        search="inflation", start_date="2024-06-01", end_date="2024-06-30", sub_queries=None,
+    )
+    # The subject becomes the topic of the next follow-ups
+    check_follow_up(
+        state, "and in July?",
+        query="what about inflation in July 2024?", search=None, start_date="2024-07-01", end_date="2024-07-31",
+    )
+    assert state.topic == "inflation", state.topic
+    check_follow_up(state, "why?", elaboration=True)
+    print('-'*50)
+
+    # Conversation about compared periods: the new period replaces both
+    state = SessionState.start("Compare 2008 versus 2020 unemployment tone?", "check")
+    assert state.topic == "Compare unemployment tone?", state.topic
+    check_follow_up(
+        state, "and in 2022?",
+        query="Compare unemployment tone in 2022?", search=None, start_date="2022-01-01", end_date="2022-12-31",
+    )
+    print('-'*50)
+
+    # Compared periods stay separate sub-queries of the new subject
+    state = SessionState.start("What did the Fed say about unemployment in 2020?", "check")
+    check_follow_up(
+        state, "also inflation in 2023 versus 2019?",
+        search="inflation",
+        sub_queries=[
+            ("inflation in 2023?", "2023-01-01", "2023-12-31"),
+            ("inflation in 2019?", "2019-01-01", "2019-12-31"),
+        ],
+    )
+    # Another subject without a period keeps the compared periods apart
+    check_follow_up(
+        state, "and what about wages?",
+        search="wages",
+        sub_queries=[
+            ("wages in 2023?", "2023-01-01", "2023-12-31"),
+            ("wages in 2019?", "2019-01-01", "2019-12-31"),
+        ],
+    )
+    print('-'*50)
+
+    # New subject without a period: searched in the period of the conversation
+    state = SessionState.start("What did the Fed say about inflation in 2015?", "check")
+    check_follow_up(
+        state, "And what about the labor market?",
+        search="the labor market", start_date="2015-01-01", end_date="2015-12-31", elaboration=False,
+    )
+    check_follow_up(state, "Tell me more.", elaboration=True)
+    print('-'*50)
+    print("Follow-up checks passed")
+
+if __name__ == "__main__":
+    main()
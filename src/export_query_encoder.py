@@ -0,0 +1,65 @@
+import json
+import os
+
+from utils.encoders import export_onnx_encoder, check_parity, ONNXEmbeddings, ONNX_ENCODER_DIR
+from utils.llms import load_embedding_model
+from utils.local_index import LocalIndex
+
+# Exported production collection (see data/quantize_collection.py), used to compare retrieved chunks
+INDEX_DIR = os.path.join("data", "indexes", "Recursive_character_size-1500_overlap-15")
+PARITY_FILE = "parity_report.json"
+
+# Minimum cosine similarity with the PyTorch encoder to accept the exported model
+MIN_COSINE = 0.98
+
+PARITY_QUERIES = [
+    "How did the sentiment and usage of the term 'transitory' to describe inflation evolve in press conferences throughout 2021? When did the tone shift from confident to concerned?",
+    "Compare the tone of urgency regarding unemployment post-2008 versus the tone during the onset of the pandemic in 2020.",
+    "What was the specific interest rate decision announced in the December 2025 press conference, and how did Chair Powell describe the availability of federal government data regarding the economic outlook?",
+    "Provide a sentiment analysis of the early 2024 Federal Reserve press releases.",
+    "What did the Chair say about the balance sheet runoff?",
+    "How does the Committee assess the risks to the labor market?",
+    "Was the rate cut in September 2024 larger than usual?",
+    "What is the Fed's view on tariffs and inflation expectations?",
+    "When did the Committee start tapering asset purchases?",
+    "How did the Fed describe the banking stress in March 2023?",
+    "What guidance was given about the pace of future rate increases in 2022?",
+    "Is the Fed concerned about financial stability risks from high asset prices?",
+    "What did the Chair say about wage growth?",
+    "How did the Fed respond to the oil price decline in 2015?",
+    "What is the longer-run inflation goal?",
+    "Did the Chair mention a possible recession?",
+    "How did the Fed describe the housing market recovery?",
+    "What forward guidance was given in 2012?",
+    "How did the Fed describe the supply chain disruptions?",
+    "What was said about the neutral rate of interest?",
+]
+
+
+def main():
+    # Export and quantize the encoder only once
+    if not os.path.exists(ONNX_ENCODER_DIR):
+        export_onnx_encoder()
+    print('-'*50)
+
+    reference = load_embedding_model(device="cpu", mode="torch")
+    index = LocalIndex(INDEX_DIR) if os.path.exists(INDEX_DIR) else None
+
+    reports = {}
+    for quantized in [False, True]:
+        mode = "onnx-int8" if quantized else "onnx"
+        candidate = ONNXEmbeddings(quantized=quantized)
+        report = check_parity(reference, candidate, PARITY_QUERIES, index=index)
+        report["passed"] = report["cosine_min"] >= MIN_COSINE
+        reports[mode] = report
+
+        print(f"Parity check for '{mode}': {json.dumps(report, indent=2)}")
+        print('-'*50)
+
+    with open(os.path.join(ONNX_ENCODER_DIR, PARITY_FILE), "w", encoding="utf-8") as f:
+        json.dump(reports, f, indent=2)
+    print(f"Parity report saved to '{ONNX_ENCODER_DIR}/{PARITY_FILE}'")
+    print("Set QUERY_ENCODER_MODE=onnx-int8 (or onnx) to serve queries with the exported encoder.")
+
+if __name__ == "__main__":
+    main()
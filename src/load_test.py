@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import numpy as np
+import threading
+import psutil
+import json
+import time
+import os
+
+from utils.fake_llm import serve_fake_llm
+from utils.format import parse_response
+
+# Load profile
+# Requests served at the same time (the concurrency limit of the UI event)
+CONCURRENCY = int(os.getenv("LOAD_CONCURRENCY", 20))
+# Poisson arrivals per second, 0 sends every request at once
+ARRIVAL_RATE = float(os.getenv("LOAD_ARRIVAL_RATE", 2.0))
+N_REQUESTS = int(os.getenv("LOAD_REQUESTS", 200))
+
+# Local stand-in of the Groq API
+FAKE_LLM_PORT = int(os.getenv("FAKE_LLM_PORT", 8090))
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", 800))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", 100))
+
+# None to search Chroma, "int8" or "float16" for the quantized local indexes
+QUANTIZATION = os.getenv("LOAD_QUANTIZATION") or None
+MEMORY_SAMPLE_SECONDS = 0.5
+REPORT_FILE = "load_test_report.json"
+
+QUESTIONS = [
+    "How did the sentiment and usage of the term 'transitory' to describe inflation evolve in press conferences throughout 2021?",
+    "Compare the tone of urgency regarding unemployment post-2008 versus the tone during the onset of the pandemic in 2020.",
+    "What was the specific interest rate decision announced in the December 2025 press conference?",
+    "Provide a sentiment analysis of the early 2024 Federal Reserve press releases.",
+    "What did the Chair say about the balance sheet runoff?",
+    "How does the Committee assess the risks to the labor market?",
+    "Was the rate cut in September 2024 larger than usual?",
+    "What is the Fed's view on tariffs and inflation expectations?",
+    "How did the Fed describe the banking stress in March 2023?",
+    "What did the Chair say about wage growth?",
+]
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    return {f"p{p}": float(np.percentile(values, p)) for p in [50, 95, 99]}
+
+def sample_memory(samples, stop, start):
+    """
+    Records the resident memory of the serving process until `stop` is set.
+    """
+    process = psutil.Process()
+    while not stop.is_set():
+        samples.append({"seconds": time.perf_counter() - start, "rss_mb": process.memory_info().rss / 2**20})
+        stop.wait(MEMORY_SAMPLE_SECONDS)
+
+def run_request(engine, question, arrival):
+    """
+    Streams one answer and times it from its arrival.
+    """
+    started = time.perf_counter()
+    result = {"queue_ms": (started - arrival) * 1000}
+    try:
+        chunks = []
+        for chunk in engine.stream(question):
+            if not chunks and chunk:
+                result["ttft_ms"] = (time.perf_counter() - arrival) * 1000
+            chunks.append(chunk)
+        parse_response("".join(chunks))
+        result["latency_ms"] = (time.perf_counter() - arrival) * 1000
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def run_load_test(engine, n_requests=N_REQUESTS, concurrency=CONCURRENCY, arrival_rate=ARRIVAL_RATE, seed=0):
+    """
+    Sends n_requests questions to the engine with Poisson arrivals (open loop), served by
+    `concurrency` workers. Requests that arrive while every worker is busy wait in the queue.
+    Returns:
+        report (dict): Throughput, queueing delay, end-to-end latency, time-to-first-token and memory.
+    """
+    rng = np.random.default_rng(seed)
+    gaps = rng.exponential(1 / arrival_rate, n_requests) if arrival_rate > 0 else np.zeros(n_requests)
+    arrivals = np.cumsum(gaps) - gaps[0]
+
+    memory, stop = [], threading.Event()
+    start = time.perf_counter()
+    sampler = threading.Thread(target=sample_memory, args=(memory, stop, start), daemon=True)
+    sampler.start()
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i, offset in enumerate(arrivals):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(run_request, engine, QUESTIONS[i % len(QUESTIONS)], time.perf_counter()))
+        results = [future.result() for future in futures]
+
+    duration = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+
+    completed = [r for r in results if "error" not in r]
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "arrival_rate": arrival_rate,
+        "errors": len(results) - len(completed),
+        "duration_seconds": duration,
+        "throughput_rps": len(completed) / duration,
+        "queue_ms": percentiles([r["queue_ms"] for r in results]),
+        "latency_ms": percentiles([r["latency_ms"] for r in completed]),
+        "ttft_ms": percentiles([r["ttft_ms"] for r in completed if "ttft_ms" in r]),
+        "peak_rss_mb": max(sample["rss_mb"] for sample in memory),
+        "memory": memory,
+    }
+
+def main():
+    print('-'*50)
+    server = multiprocessing.Process(
+        target=serve_fake_llm,
+        kwargs={"port": FAKE_LLM_PORT, "latency_ms": FAKE_LLM_LATENCY_MS, "tokens_per_second": FAKE_LLM_TOKENS_PER_SECOND},
+        daemon=True
+    )
+    server.start()
+    # ChatGroq reads its endpoint from the environment
+    os.environ["GROQ_API_BASE"] = f"http://127.0.0.1:{FAKE_LLM_PORT}"
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+    print(f"Fake LLM server on port {FAKE_LLM_PORT} ({FAKE_LLM_LATENCY_MS:.0f} ms to first token, {FAKE_LLM_TOKENS_PER_SECOND:.0f} tokens/s)")
+    print('-'*50)
+
+    from utils.engine import RAGEngine, DEFAULT_COLLECTION
+
+    # Same engine as the UI: one process, shared models, requests served by threads
+    # Served like the UI, concurrent queries are micro-batched
+    engine = RAGEngine(default_collection=DEFAULT_COLLECTION, quantization=QUANTIZATION, micro_batch=True)
+    try:
+        # The first request pays for lazy initializations, it is not measured
+        run_request(engine, QUESTIONS[0], time.perf_counter())
+        print(f"Sending {N_REQUESTS} requests, concurrency {CONCURRENCY}, {ARRIVAL_RATE} requests/s")
+        report = run_load_test(engine)
+    finally:
+        engine.close()
+        server.terminate()
+
+    print('-'*50)
+    print(f"Throughput: {report['throughput_rps']:.2f} requests/s ({report['errors']} errors)")
+    for key in ["queue_ms", "latency_ms", "ttft_ms"]:
+        print(f"{key}: " + ", ".join(f"{name}={value:.0f}" for name, value in report[key].items()))
+    print(f"Peak RSS: {report['peak_rss_mb']:.0f} MB")
+
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print('-'*50)
+    print(f"Report saved to '{REPORT_FILE}'")
+
+if __name__ == "__main__":
+    main()
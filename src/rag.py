@@ -1,82 +1,42 @@
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableLambda
-from langchain_chroma import Chroma
-from chromadb import HttpClient
-from operator import itemgetter
-import torch
-
-from utils.llms import load_model, load_embedding_model
-from utils.format import parse_with_fixer, format_docs
-from utils.prompts import get_system_prompt
-
-def rag(query):
+from utils.llms import QUERY_ENCODER_MODE
+from utils.engine import RAGEngine, DEFAULT_COLLECTION
+
+def rag(query, quantization=None, ann=None, encoder_mode=QUERY_ENCODER_MODE, rerank=False, meeting_summaries=True, decompose=True, speaker_filter=True):
+    """
+    Runs the RAG pipeline for a single question.
+    Every call builds a new engine (models included); long-running processes such as
+    the Gradio UI keep one RAGEngine alive instead.
+    Args:
+        query (str): User question.
+        quantization (str): None to search the Chroma collection, "int8" or "float16"
+            to search the quantized local index with full precision rescoring.
+        ann (str): "hnsw" or "ivf" to search the ANN local index of the collection.
+        encoder_mode (str): Query encoder, "torch", "onnx" or "onnx-int8".
+        rerank (bool): Score the fetch_k candidates with a cross-encoder and keep
+            only the best RERANK_TOP_N fragments instead of the k MMR results.
+        meeting_summaries (bool): Answer aggregate questions over a period ("sentiment of early 2024")
+            from the precomputed meeting table plus AGGREGATE_K supporting fragments.
+        decompose (bool): Split multi-period questions ("2008 vs 2020") into sub-queries
+            retrieved concurrently, with an equal share of the k fragments per period.
+        speaker_filter (bool): Search only the Chair's opening statement and answers for questions
+            about the official Fed view (collections built with speaker segmentation).
+    """
 
     # Initial Set up
     print('-'*50)
-    # Check for GPU availability
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"Using device: {device}")
-    print('-'*50)
-
-    # Check if Chroma server is running and connect to it
-    try:
-        client = HttpClient(host="http://localhost:8000")
-        print("Chroma server is running.")
-    except Exception as e:
-        raise e
-
-    print('-'*50)
-
-    # Load embedding model
-    embedding_model = load_embedding_model(device=device)
-
-    print("Embedding model loaded successfully.")
-    print('-'*50)
-
-    # Load llm model and his system prompt
-    prompt = get_system_prompt()
-    llm = load_model()
-
-    # Best retrieval parameters from experiments
-    collection_name = "Recursive_character_size-1500_overlap-15"
-    k = 20
-
-    try:
-        # Load Chroma collection
-        vectorstore = Chroma(
-            collection_name=collection_name,
-            embedding_function=embedding_model,
-            client=client
-        )
-    except Exception as e:
-        print(f"Failed to load Chroma collection: {collection_name}")
-        raise e
-    
-    print(f"Chroma collection '{collection_name}' loaded successfully.")
-    print('-'*50)
-
-    retriever = vectorstore.as_retriever(
-    search_type="mmr",
-    search_kwargs={
-    "k": k,
-    "fetch_k": k * 5,
-    "lambda_mult": 0.7             
-        }
-    )
-
-    rag_chain = (
-    {
-        # Extract the string first before giving it to the retriever
-        "context": (itemgetter("question")) | retriever | format_docs, 
-        "question": itemgetter("question")
-    }
-    | prompt
-    | llm.bind(stop=["Human:", "System:"])
-    | StrOutputParser()
-    | RunnableLambda(parse_with_fixer)
+    engine = RAGEngine(
+        default_collection=DEFAULT_COLLECTION,
+        quantization=quantization,
+        ann=ann,
+        encoder_mode=encoder_mode,
+        rerank=rerank,
+        meeting_summaries=meeting_summaries,
+        decompose=decompose,
+        speaker_filter=speaker_filter
     )
 
-    answer = rag_chain.invoke({"question": query})
+    answer = engine.answer(query)
+    engine.close()
 
     return answer
 
@@ -84,4 +44,4 @@ if __name__ == "__main__":
     question = "Provide a sentiment analysis of the early 2024 Federal Reserve press releases and justify your answer with specific references to the text."
     answer = rag(question)   
     print(answer)
-    input("Press Enter to continue...")
\ No newline at end of file
+    input("Press Enter to continue...")
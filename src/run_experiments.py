@@ -1,39 +1,47 @@
 import json
 import time
-import torch
 import mlflow
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableLambda
-from langchain_chroma import Chroma
-from chromadb import HttpClient
 from operator import itemgetter
 
 from utils.prompts import get_system_prompt
 from utils.evaluate import log_params_from_collection_name, evaluate_query
-from utils.format import parse_with_fixer, format_docs
-from utils.llms import load_model, load_judge_model, load_embedding_model
+from utils.format import parse_response, format_docs
+from utils.llms import load_model, load_judge_model, load_embedding_model, get_device, LLM_SETTINGS, JUDGE_SETTINGS
+from utils.replay import ReplayStore, RecordedChatModel, recorded_retriever, collection_fingerprint
 
 # Initial Set up
 print('-'*50)
-# Check for GPU availability
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
+
+# Retrieval results and LLM outputs are replayed from the local recordings when their
+# inputs did not change (REPLAY_MODE=offline never calls Chroma, Groq or the judge)
+store = ReplayStore()
+print(f"Replay mode: {store.mode}")
 print('-'*50)
 
-# Check if Chroma server is running and connect to it
-try:
-    client = HttpClient(host="http://localhost:8000")
-    print("Chroma server is running.")
-except Exception as e:
-    raise e
+# Chroma and the embedding model are only loaded when a retrieval can not be replayed
+client = None
+embedding_model = None
 
-print('-'*50)
+def get_client():
+    global client
+    if client is None:
+        from chromadb import HttpClient
 
-# Load embedding model
-embedding_model = load_embedding_model(device=device)
+        # Check if Chroma server is running and connect to it
+        client = HttpClient(host="http://localhost:8000")
+        print("Chroma server is running.")
+        print('-'*50)
+    return client
 
-print("Embedding model loaded successfully.")
-print('-'*50)
+def get_embedding_model():
+    global embedding_model
+    if embedding_model is None:
+        embedding_model = load_embedding_model(device=get_device())
+        print("Embedding model loaded successfully.")
+        print('-'*50)
+    return embedding_model
 
 # Conect to Mlflow Tracking Server
 try:
@@ -54,8 +62,8 @@ except Exception as e:
 
 prompt = get_system_prompt()
 
-llm = load_model()
-llm_judge = load_judge_model()
+llm = RecordedChatModel(store, {"provider": "groq", **LLM_SETTINGS}, load_model)
+llm_judge = RecordedChatModel(store, {"provider": "huggingface", **JUDGE_SETTINGS}, load_judge_model)
 
 TEST_QUERIES = [
     # 1. Covid evolution (2021)
@@ -68,7 +76,7 @@ TEST_QUERIES = [
     "What was the specific interest rate decision announced in the December 2025 press conference, and how did Chair Powell describe the availability of federal government data regarding the economic outlook?"
 ]
 
-def run_experiment(collection_name: str, k_mmr: int):
+def run_experiment(collection_name: str, fingerprint: dict, k_mmr: int):
 
     # Define run name
     run_name = f"{collection_name}_k-{k_mmr}"
@@ -77,23 +85,32 @@ def run_experiment(collection_name: str, k_mmr: int):
     mlflow.start_run(run_name=run_name)
     log_params_from_collection_name(collection_name)
     mlflow.log_param("k", k_mmr)
-    
-    # Load Chroma collection
-    vectorstore = Chroma(
-        collection_name=collection_name,
-        embedding_function=embedding_model,
-        client=client
-    )
-    
-    # MMR Retriever
-    retriever = vectorstore.as_retriever(
-        search_type="mmr",
-        search_kwargs={
+    store.run_name = run_name
+    hits, misses = store.hits.copy(), store.misses.copy()
+
+    search_kwargs = {
         "k": k_mmr,
         "fetch_k": k_mmr * 5,
         "lambda_mult": 0.7 # Higher lambda favors relevance over diversity
                            # Initially was going to test different values, but token limit constraints
-        }
+    }
+
+    def make_retriever():
+        from langchain_chroma import Chroma
+
+        # Load Chroma collection
+        vectorstore = Chroma(
+            collection_name=collection_name,
+            embedding_function=get_embedding_model(),
+            client=get_client()
+        )
+        # MMR Retriever
+        return vectorstore.as_retriever(search_type="mmr", search_kwargs=search_kwargs)
+
+    retriever = recorded_retriever(
+        store,
+        {"collection_name": collection_name, **fingerprint, "search_type": "mmr", **search_kwargs},
+        make_retriever
     )
     
     # Rag chain
@@ -106,7 +123,7 @@ def run_experiment(collection_name: str, k_mmr: int):
     | prompt
     | llm.bind(stop=["Human:", "System:"])
     | StrOutputParser()
-    | RunnableLambda(parse_with_fixer)
+    | RunnableLambda(parse_response)
     )
 
     overall_score = 0
@@ -116,6 +133,7 @@ def run_experiment(collection_name: str, k_mmr: int):
 
         # Run the RAG chain
         start = time.time()
+        live_calls = llm.live_calls
         answer = rag_chain.invoke({"question": query})
         mlflow.log_text(json.dumps(answer, indent=2), f"answer_query_{query_id}.json")  
 
@@ -124,12 +142,18 @@ def run_experiment(collection_name: str, k_mmr: int):
         print(f"Results for query {query_id}: {json.dumps(results, indent=2)}")
         print('-'*50)
 
+        # Replayed answers do not count against the Groq rate limit
         duration = time.time() - start
-        if duration < 31:
+        if llm.live_calls > live_calls and duration < 31:
             sleep_time = 31 - duration
             time.sleep(sleep_time)
 
     mlflow.log_metric("overall_score", overall_score)
+    # LLM calls (answers and judge verdicts) and retrievals are counted apart
+    mlflow.log_metric("replayed_llm_calls", store.hits["llm"] - hits["llm"])
+    mlflow.log_metric("live_llm_calls", store.misses["llm"] - misses["llm"])
+    mlflow.log_metric("replayed_retrievals", store.hits["retrieval"] - hits["retrieval"])
+    mlflow.log_metric("live_retrievals", store.misses["retrieval"] - misses["retrieval"])
     mlflow.end_run()
 
     print(f"Overall score for experiment {run_name}: {overall_score}")
@@ -138,24 +162,35 @@ def run_experiment(collection_name: str, k_mmr: int):
 
 # Experiment execution loop
 
-# Load Chroma collections
-try:
-    collections = client.list_collections()
-    print("Collections:")
-    for i, col in enumerate(collections):
-        print(f" {i+1}. {col.name} - {col.count()}")
-    print("-"*51)
-
-    collections = [col.name for col in collections]
-except Exception as e:
-    print("Failed to retrieve collections from Chroma server.")
-    raise e
+# Load Chroma collections, offline replay reuses the list of the last recorded grid
+# (with the fingerprints of the collections, so it replays the retrievals of that data)
+if store.mode == "offline":
+    collections = store.get("collection_fingerprints", {})
+    if collections is None:
+        raise LookupError("No recorded experiment grid, run the experiments once with REPLAY_MODE=replay")
+else:
+    try:
+        collections = get_client().list_collections()
+        print("Collections:")
+        for i, col in enumerate(collections):
+            print(f" {i+1}. {col.name} - {col.count()}")
+        print("-"*51)
+
+        collections = {col.name: collection_fingerprint(col) for col in collections}
+    except Exception as e:
+        print("Failed to retrieve collections from Chroma server.")
+        raise e
+    store.put("collection_fingerprints", {}, collections)
 
 # Number of documents to retrieve
 k_values = [10, 20, 30, 50]
 
-for collection_name in collections:
+for collection_name, fingerprint in collections.items():
     for k in k_values:
-        run_experiment(collection_name, k)
+        run_experiment(collection_name, fingerprint, k)
+
+print(f"Replayed LLM calls: {store.hits['llm']}, live LLM calls: {store.misses['llm']}")
+print(f"Replayed retrievals: {store.hits['retrieval']}, live retrievals: {store.misses['retrieval']}")
+store.close()
 
 input("All experiments completed. Press Enter to exit.")
@@ -0,0 +1,88 @@
+import numpy as np
+import faiss
+import math
+import os
+
+from .local_index import LocalIndex, VECTORS_FILE, save_params
+
+ANN_BACKENDS = ["hnsw", "ivf"]
+
+# Build parameters, persisted in the params file of the index directory
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+IVF_CLUSTERS_PER_SQRT_N = 4
+
+# Default search-time knobs
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 8
+
+
+def ann_file(backend):
+    return f"ann_{backend}.faiss"
+
+def build_ann_index(index_dir, backend="hnsw", m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, nlist=None):
+    """
+    Builds a faiss ANN index (inner product, the vectors are normalized) over an exported collection.
+    Args:
+        index_dir (str): Directory created by `export_collection`.
+        backend (str): "hnsw" (graph) or "ivf" (inverted lists over k-means clusters).
+        m (int): HNSW neighbours per node.
+        ef_construction (int): HNSW candidate list size while building.
+        nlist (int): IVF number of clusters, 4 * sqrt(n) by default.
+    """
+    if backend not in ANN_BACKENDS:
+        raise ValueError(f"Unknown ANN backend: {backend}. Use one of {ANN_BACKENDS}")
+
+    vectors = np.ascontiguousarray(np.load(os.path.join(index_dir, VECTORS_FILE)), dtype=np.float32)
+    n, dim = vectors.shape
+
+    if backend == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        params = {"m": m, "ef_construction": ef_construction, "ef_search": HNSW_EF_SEARCH}
+    else:
+        nlist = nlist or max(1, int(IVF_CLUSTERS_PER_SQRT_N * math.sqrt(n)))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        params = {"nlist": nlist, "nprobe": IVF_NPROBE}
+
+    index.add(vectors)
+    faiss.write_index(index, os.path.join(index_dir, ann_file(backend)))
+    save_params(index_dir, {f"ann_{backend}": params})
+
+    print(f"{backend} index saved in '{index_dir}' ({params})")
+
+
+class ANNIndex(LocalIndex):
+    """
+    Approximate nearest neighbour search with a persisted faiss index, behind the LocalIndex interface.
+    The recall / latency trade-off is tuned at search time with `ef_search` (HNSW) or `nprobe` (IVF).
+    """
+    def __init__(self, index_dir, backend="hnsw", ef_search=None, nprobe=None):
+        super().__init__(index_dir)
+        if backend not in ANN_BACKENDS:
+            raise ValueError(f"Unknown ANN backend: {backend}. Use one of {ANN_BACKENDS}")
+
+        self.backend = backend
+        self.index = faiss.read_index(os.path.join(index_dir, ann_file(backend)))
+        build_params = self.params.get(f"ann_{backend}", {})
+        self.ef_search = ef_search or build_params.get("ef_search", HNSW_EF_SEARCH)
+        self.nprobe = nprobe or build_params.get("nprobe", IVF_NPROBE)
+
+    def search_parameters(self, ef_search=None, nprobe=None):
+        # Passed per call, so concurrent searches with different knobs do not interfere
+        if self.backend == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search)
+        return faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe)
+
+    def search(self, query_vector, k, ef_search=None, nprobe=None):
+        query = np.ascontiguousarray(query_vector, dtype=np.float32).reshape(1, -1)
+        scores, positions = self.index.search(query, k, params=self.search_parameters(ef_search, nprobe))
+        # faiss pads with -1 when less than k neighbours are found
+        found = positions[0] >= 0
+        return positions[0][found], scores[0][found]
+
+    def memory_bytes(self):
+        # Size of the serialized faiss index (vectors + graph / inverted lists)
+        return os.path.getsize(os.path.join(self.index_dir, ann_file(self.backend)))
@@ -0,0 +1,82 @@
+from langchain_core.embeddings import Embeddings
+from concurrent.futures import Future
+import threading
+import queue
+import time
+
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 10
+
+
+class MicroBatchEmbeddings(Embeddings):
+    """
+    Micro-batcher in front of the query encoder.
+    Concurrent `embed_query` calls are gathered for up to `max_wait_ms` milliseconds
+    or `max_batch_size` queries, encoded in a single batched forward pass, and each
+    caller gets its own vector back through a future.
+    """
+    def __init__(self, embeddings, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        # No request is queued once close() has sent the stop signal
+        self.closed = False
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self.run, name="embedding-micro-batcher", daemon=True)
+        self.worker.start()
+
+    def gather(self):
+        """
+        Blocks until a request arrives, then collects the batch.
+        """
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        stopped = False
+        while not stopped:
+            batch = self.gather()
+            # None is the stop signal sent by close()
+            stopped = None in batch
+            batch = [request for request in batch if request is not None]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+    def embed_query(self, text):
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("The micro-batcher is closed, no query can be embedded")
+            self.requests.put((text, future))
+        return future.result()
+
+    def embed_documents(self, texts):
+        # Indexing batches are already large, they go straight to the encoder
+        return self.embeddings.embed_documents(texts)
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.requests.put(None)
+        self.worker.join()
@@ -0,0 +1,145 @@
+import numpy as np
+import json
+import zlib
+import re
+
+from .periods import date_number
+
+# MinHash signature length, split into LSH bands of ROWS_PER_BAND values
+NUM_PERMUTATIONS = 128
+ROWS_PER_BAND = 8
+# Word n-grams compared between chunks
+SHINGLE_SIZE = 5
+# Estimated Jaccard similarity above which two chunks are near-duplicates
+JACCARD_THRESHOLD = 0.85
+
+# Mersenne prime of the universal hash functions (a * x + b) mod p, small enough for uint64 products
+PRIME = (1 << 31) - 1
+# Dates of the sources, chunks of PDFs without a creation date have none
+ISO_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def shingle_hashes(text, shingle_size=SHINGLE_SIZE):
+    """
+    32-bit hashes of the word n-grams of a text.
+    """
+    words = text.split()
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i : i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)))
+
+def minhash_signatures(texts, num_permutations=NUM_PERMUTATIONS, seed=0):
+    """
+    MinHash signature of each text: the minimum of each hash permutation over its shingles.
+    The fraction of equal values between two signatures estimates their Jaccard similarity.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, PRIME, num_permutations, dtype=np.uint64)
+    b = rng.integers(0, PRIME, num_permutations, dtype=np.uint64)
+
+    signatures = np.empty((len(texts), num_permutations), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hashes = shingle_hashes(text) % PRIME
+        signatures[i] = ((a[:, None] * hashes[None, :] + b[:, None]) % PRIME).min(axis=1)
+    return signatures
+
+def find_root(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+def cluster_near_duplicates(signatures, rows_per_band=ROWS_PER_BAND, threshold=JACCARD_THRESHOLD):
+    """
+    Groups the texts whose signatures collide in an LSH band and whose estimated
+    Jaccard similarity reaches the threshold (union-find over the verified pairs).
+    Returns:
+        clusters (list): Lists of positions, each sorted, in order of their first member.
+    """
+    n_texts, num_permutations = signatures.shape
+    parents = list(range(n_texts))
+
+    for start in range(0, num_permutations, rows_per_band):
+        buckets = {}
+        for i, band in enumerate(signatures[:, start : start + rows_per_band]):
+            buckets.setdefault(band.tobytes(), []).append(i)
+
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                root_first, root_other = find_root(parents, first), find_root(parents, other)
+                if root_first == root_other:
+                    continue
+                # LSH candidates are verified with the full signatures
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    parents[max(root_first, root_other)] = min(root_first, root_other)
+
+    clusters = {}
+    for i in range(n_texts):
+        clusters.setdefault(find_root(parents, i), []).append(i)
+    return list(clusters.values())
+
+def source_dates(metadata):
+    """
+    ISO dates of every meeting a (deduplicated) chunk appears in, its own date if it has no duplicates.
+    Copies without a date are left out.
+    """
+    if metadata.get('sources'):
+        dates = [str(source[0])[:10] for source in json.loads(metadata['sources'])]
+    else:
+        dates = [str(metadata.get('creationdate', ''))[:10]]
+    return [date for date in dates if ISO_DATE_PATTERN.match(date)]
+
+def date_range(metadata):
+    """
+    First and last dates (YYYYMMDD integers) of the meetings a chunk appears in.
+    Returns:
+        date_range (tuple): None if no copy of the chunk has a date.
+    """
+    dates = [date_number(date) for date in source_dates(metadata)]
+    if not dates:
+        return None
+    return min(dates), max(dates)
+
+def deduplicate_chunks(chunks, threshold=JACCARD_THRESHOLD):
+    """
+    Keeps one representative (the most recent occurrence) of each cluster of near-identical chunks,
+    so it is cited with the date of the latest meeting that repeated it.
+    The representative lists every source of its cluster in the "sources" metadata, a JSON
+    list of [creationdate, page] pairs sorted by date (Chroma metadata values must be scalars),
+    and the cluster size in "duplicates".
+    Args:
+        chunks (list): LangChain documents.
+        threshold (float): Estimated Jaccard similarity of near-duplicates.
+    Returns:
+        kept (list): Deduplicated chunks, in their original order.
+        stats (dict): Chunks before and after, and the dedup ratio (fraction of chunks removed).
+    """
+    if not chunks:
+        return chunks, {"chunks_before_dedup": 0, "chunks_after_dedup": 0, "dedup_ratio": 0.0}
+
+    signatures = minhash_signatures([chunk.page_content for chunk in chunks])
+    kept = []
+    for cluster in cluster_near_duplicates(signatures, threshold=threshold):
+        sources = []
+        for i in cluster:
+            source = [chunks[i].metadata.get('creationdate'), chunks[i].metadata.get('page')]
+            if source not in sources:
+                sources.append(source)
+        # Copies without a date come first
+        sources.sort(key=lambda source: str(source[0] or ""))
+        # Latest dated copy, the first one in the cluster order on ties
+        latest = max(cluster, key=lambda i: (max(source_dates(chunks[i].metadata), default=""), -i))
+        representative = chunks[latest]
+        representative.metadata = {**representative.metadata, "sources": json.dumps(sources), "duplicates": len(cluster)}
+        kept.append((latest, representative))
+    kept = [chunk for _, chunk in sorted(kept, key=lambda item: item[0])]
+
+    stats = {
+        "chunks_before_dedup": len(chunks),
+        "chunks_after_dedup": len(kept),
+        "dedup_ratio": 1 - len(kept) / len(chunks),
+    }
+    return kept, stats
@@ -0,0 +1,189 @@
+from langchain_core.embeddings import Embeddings
+import numpy as np
+import time
+import os
+
+EMBEDDING_MODEL_NAME = "BAAI/bge-large-en-v1.5"
+# Default location of the exported query encoder
+ONNX_ENCODER_DIR = os.path.join("models", "bge-large-en-v1.5-onnx")
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+# Fast tokenizer saved next to the model, loaded without importing transformers
+TOKENIZER_FILE = "tokenizer.json"
+# Suffix of the graph-optimized models saved by `save_optimized_model`
+OPTIMIZED_SUFFIX = ".opt.onnx"
+
+
+def cls_pooling(model):
+    """
+    Wraps the transformer to output the CLS token, the pooling used by bge models.
+    """
+    import torch
+
+    class CLSPooling(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            output = self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)
+            return output.last_hidden_state[:, 0]
+
+    return CLSPooling(model)
+
+def optimized_path(model_path):
+    return model_path[: -len(".onnx")] + OPTIMIZED_SUFFIX
+
+def save_optimized_model(model_dir=ONNX_ENCODER_DIR, quantized=True):
+    """
+    Saves the ONNX encoder after onnxruntime graph optimizations, so later processes
+    load the optimized graph directly instead of optimizing it at every start.
+    Returns:
+        path (str): Path of the optimized model.
+    """
+    import onnxruntime as ort
+
+    model_path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+    options = ort.SessionOptions()
+    # Extended optimizations are hardware independent, unlike the layout ones of ORT_ENABLE_ALL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.optimized_model_filepath = optimized_path(model_path)
+    ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+    return options.optimized_model_filepath
+
+
+def export_onnx_encoder(model_name=EMBEDDING_MODEL_NAME, output_dir=ONNX_ENCODER_DIR, quantize=True):
+    """
+    Exports the embedding model to ONNX and optionally applies dynamic int8 quantization.
+    The exported model keeps the same vector space, so the existing collections can be
+    queried without re-indexing.
+    Args:
+        model_name (str): Hugging Face model id.
+        output_dir (str): Directory for the ONNX files and the tokenizer.
+        quantize (bool): Also save an int8 quantized version of the model.
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from transformers import AutoModel, AutoTokenizer
+    import torch
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = cls_pooling(AutoModel.from_pretrained(model_name)).eval()
+
+    dummy = tokenizer(["What did the Chair say about inflation?"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    onnx_path = os.path.join(output_dir, ONNX_FILE)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=["embedding"],
+            dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in input_names}, "embedding": {0: "batch"}},
+            opset_version=17,
+        )
+    tokenizer.save_pretrained(output_dir)
+    print(f"ONNX encoder saved to '{onnx_path}'")
+
+    if quantize:
+        int8_path = os.path.join(output_dir, ONNX_INT8_FILE)
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"int8 ONNX encoder saved to '{int8_path}'")
+
+
+class ONNXEmbeddings(Embeddings):
+    """
+    LangChain embeddings backed by an onnxruntime session of the exported encoder.
+    Produces normalized CLS embeddings, like HuggingFaceEmbeddings with bge models.
+    Neither torch nor transformers are imported: the tokenizer is loaded with the
+    `tokenizers` library and the graph optimized by the warmup command is used when present.
+    """
+    def __init__(self, model_dir=ONNX_ENCODER_DIR, quantized=True, max_length=512, batch_size=32):
+        from tokenizers import Tokenizer
+        import onnxruntime as ort
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]"), pad_token="[PAD]")
+
+        model_path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        options = ort.SessionOptions()
+        if os.path.exists(optimized_path(model_path)):
+            # Already optimized offline
+            model_path = optimized_path(model_path)
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+    def encode(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        tokens = {
+            "input_ids": [e.ids for e in encodings],
+            "attention_mask": [e.attention_mask for e in encodings],
+            "token_type_ids": [e.type_ids for e in encodings],
+        }
+        inputs = {name: np.asarray(tokens[name], dtype=np.int64) for name in self.input_names}
+        embeddings = self.session.run(None, inputs)[0]
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    def embed_documents(self, texts):
+        embeddings = []
+        for i in range(0, len(texts), self.batch_size):
+            embeddings.extend(self.encode(texts[i : i + self.batch_size]).tolist())
+        return embeddings
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+
+def check_parity(reference, candidate, queries, index=None, k=20):
+    """
+    Compares a candidate query encoder against the float32 PyTorch encoder.
+    Args:
+        reference: Reference embeddings (float32 HuggingFaceEmbeddings).
+        candidate: Embeddings to validate.
+        queries (list): Queries embedded one by one, like at serving time.
+        index: Optional LocalIndex, to also compare the top-k retrieved chunks.
+        k (int): Number of neighbours compared when an index is given.
+    Returns:
+        report (dict): Cosine similarity between both encoders, latency percentiles,
+            speedup and (with an index) the top-k overlap.
+    """
+    def timed_embeddings(embeddings):
+        vectors, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            vectors.append(embeddings.embed_query(query))
+            latencies.append((time.perf_counter() - start) * 1000)
+        return np.asarray(vectors, dtype=np.float32), np.asarray(latencies)
+
+    reference_vectors, reference_ms = timed_embeddings(reference)
+    candidate_vectors, candidate_ms = timed_embeddings(candidate)
+
+    # Both are normalized, the dot product is the cosine similarity
+    cosine = np.sum(reference_vectors * candidate_vectors, axis=1)
+
+    report = {
+        "queries": len(queries),
+        "cosine_min": float(cosine.min()),
+        "cosine_mean": float(cosine.mean()),
+        "reference_p50_ms": float(np.percentile(reference_ms, 50)),
+        "reference_p95_ms": float(np.percentile(reference_ms, 95)),
+        "candidate_p50_ms": float(np.percentile(candidate_ms, 50)),
+        "candidate_p95_ms": float(np.percentile(candidate_ms, 95)),
+    }
+    report["p95_speedup"] = report["reference_p95_ms"] / report["candidate_p95_ms"]
+
+    if index is not None:
+        overlaps = []
+        for reference_vector, candidate_vector in zip(reference_vectors, candidate_vectors):
+            expected, _ = index.search(reference_vector, k)
+            found, _ = index.search(candidate_vector, k)
+            overlaps.append(len(set(expected) & set(found)) / len(expected))
+        report[f"top{k}_overlap"] = float(np.mean(overlaps))
+
+    return report
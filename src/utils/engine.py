@@ -0,0 +1,507 @@
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from operator import itemgetter
+import numpy as np
+import threading
+import math
+import time
+import os
+
+from .llms import load_model, load_embedding_model, load_reranker_model, get_device, QUERY_ENCODER_MODE
+from .format import parse_response, format_docs
+from .local_index import maximal_marginal_relevance
+from .prompts import get_system_prompt
+from .rerank import Reranker, with_reranker
+from .meetings import meetings_for_question, format_meetings
+from .sections import chair_sections_filter, CHAIR_SECTIONS
+from .planner import SubQuery, with_planner, doc_key, merge_results, OVERFETCH
+from .sessions import SessionStore, SessionState, plan_follow_up
+from .periods import date_number
+
+# Best retrieval parameters from experiments
+DEFAULT_COLLECTION = os.getenv("DEFAULT_COLLECTION", "Recursive_character_size-1500_overlap-15")
+DEFAULT_K = 20
+
+# Local exports of the collections (see data/quantize_collection.py)
+INDEX_DIR = os.path.join("data", "indexes")
+
+# Fragments sent to the prompt when the rerank stage is enabled
+RERANK_TOP_N = 10
+
+# Supporting fragments sent with the meeting summaries for aggregate questions
+AGGREGATE_K = 6
+
+# Shadow comparisons kept in memory
+SHADOW_LOG_SIZE = 1000
+# Shadow retrievals running or waiting, the next ones are skipped under load
+SHADOW_MAX_PENDING = 2
+
+
+class RAGEngine:
+    """
+    Long-lived serving engine.
+    - Several collections are preloaded and share one embedding model and one LLM.
+    - Each request is routed to a collection by its config name (the default one if not given).
+    - The default collection can be hot-swapped atomically, e.g. after a re-index.
+    - In shadow mode, the retrieval of a candidate collection runs in the background for
+      every request and is compared with the served one, without delaying the answer.
+    """
+    def __init__(self, collection_names=None, default_collection=DEFAULT_COLLECTION, k=DEFAULT_K,
+                 quantization=None, ann=None, ann_params=None, encoder_mode=QUERY_ENCODER_MODE, rerank=False,
+                 meeting_summaries=True, decompose=True, speaker_filter=True, shadow_collection=None,
+                 client=None, embedding_model=None, llm=None, device=None, micro_batch=False):
+        """
+        Args:
+            collection_names (list): Collections preloaded at start up (the default one is always loaded).
+            default_collection (str): Collection used when a request does not name one.
+            k (int): Fragments sent to the prompt.
+            quantization (str): None to search Chroma, "int8" or "float16" to search the quantized local indexes.
+            ann (str): "hnsw" or "ivf" to search the ANN local indexes (see data/benchmark_ann.py).
+            ann_params (dict): Search-time knobs of the ANN index, "ef_search" (HNSW) or "nprobe" (IVF).
+            encoder_mode (str): Query encoder, "torch", "onnx" or "onnx-int8".
+            rerank (bool): Rerank the fetch_k candidates with a cross-encoder and keep RERANK_TOP_N fragments.
+            meeting_summaries (bool): Answer aggregate questions from the precomputed meeting table.
+            decompose (bool): Split multi-period questions into concurrent sub-retrievals.
+            speaker_filter (bool): Search only the Chair's text (opening statement and answers) for questions
+                about the official Fed view, in collections built with speaker segmentation.
+            shadow_collection (str): Candidate collection compared in the background.
+            client, embedding_model, llm: Already created backends (e.g. in-process stand-ins for tests).
+            device (str): Device of the local models, detected if not given.
+            micro_batch (bool): Encode the concurrent queries together (serving paths only, a single
+                caller would wait for the batching window for nothing).
+        """
+        if device is None:
+            # The ONNX encoder runs on CPU, torch is only imported for the models that need it
+            needs_torch = encoder_mode == "torch" and embedding_model is None
+            device = get_device() if needs_torch or rerank else "cpu"
+        self.device = device
+        print(f"Using device: {device}")
+        print('-'*50)
+
+        self.k = k
+        self.quantization = quantization
+        self.ann = ann
+        self.ann_params = ann_params or {}
+        # Local indexes are exported from Chroma and searched in-process
+        self.local_index = bool(quantization or ann)
+        self.rerank = rerank
+        self.meeting_summaries = meeting_summaries
+        self.decompose = decompose
+        self.speaker_filter = speaker_filter
+        # Whether each collection has section metadata, checked on first use
+        self.section_support = {}
+        # Whether each Chroma collection has the numeric dates of its chunks, checked on first use
+        self.date_support = {}
+
+        if client is None and not self.local_index:
+            from chromadb import HttpClient
+
+            # Check if Chroma server is running and connect to it
+            client = HttpClient(host="http://localhost:8000")
+            print("Chroma server is running.")
+            print('-'*50)
+        self.client = client
+
+        # One embedding model shared by all the collections and requests
+        self.embedding_model = embedding_model or load_embedding_model(device=device, mode=encoder_mode, micro_batch=micro_batch)
+        print("Embedding model loaded successfully.")
+        print('-'*50)
+
+        # Load llm model and his system prompt
+        self.prompt = get_system_prompt()
+        self.llm = llm or load_model()
+
+        self.reranker = None
+        if rerank:
+            self.reranker = Reranker(load_reranker_model(device=device), top_n=RERANK_TOP_N)
+            print("Reranker model loaded successfully.")
+            print('-'*50)
+
+        # Collections are replaced as a whole under the lock, readers just take a reference
+        self.lock = threading.Lock()
+        self.vectorstores = {}
+        for name in dict.fromkeys([default_collection] + list(collection_names or [])):
+            self.vectorstores[name] = self.open_collection(name)
+        self.default_collection = default_collection
+
+        self.shadow_collection = None
+        self.shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self.shadow_log = deque(maxlen=SHADOW_LOG_SIZE)
+        self.shadow_slots = threading.BoundedSemaphore(SHADOW_MAX_PENDING)
+        self.shadow_skipped = 0
+        if shadow_collection:
+            self.set_shadow_collection(shadow_collection)
+
+        # Retrieval state of the conversations, for follow-up questions
+        self.sessions = SessionStore()
+
+    def open_collection(self, name):
+        if self.ann:
+            from .ann import ANNIndex
+
+            # ANN local index of the same collection
+            vectorstore = ANNIndex(os.path.join(INDEX_DIR, name), backend=self.ann, **self.ann_params)
+            print(f"ANN index '{name}' ({self.ann}) loaded successfully.")
+        elif self.quantization:
+            from .quantize import QuantizedIndex
+
+            # Quantized local index of the same collection
+            vectorstore = QuantizedIndex(os.path.join(INDEX_DIR, name), dtype=self.quantization)
+            print(f"Quantized index '{name}' ({self.quantization}) loaded successfully.")
+        else:
+            from langchain_chroma import Chroma
+
+            try:
+                # langchain's Chroma creates missing collections, a mistyped name would serve an empty one
+                self.client.get_collection(name)
+                # Load Chroma collection
+                vectorstore = Chroma(
+                    collection_name=name,
+                    embedding_function=self.embedding_model,
+                    client=self.client
+                )
+            except Exception as e:
+                print(f"Failed to load Chroma collection: {name}")
+                raise e
+            print(f"Chroma collection '{name}' loaded successfully.")
+        print('-'*50)
+        return vectorstore
+
+    @property
+    def collection_names(self):
+        return list(self.vectorstores)
+
+    def get_vectorstore(self, collection_name=None):
+        name = collection_name or self.default_collection
+        vectorstore = self.vectorstores.get(name)
+        if vectorstore is None:
+            raise KeyError(f"Collection '{name}' is not loaded. Loaded collections: {self.collection_names}")
+        return vectorstore
+
+    def load_collection(self, name, reload=False):
+        """
+        Loads a collection, or reopens it after a re-index with reload=True.
+        The new handle is built before taking the lock, so requests are never blocked.
+        """
+        if name in self.vectorstores and not reload:
+            return
+        vectorstore = self.open_collection(name)
+        with self.lock:
+            self.vectorstores = {**self.vectorstores, name: vectorstore}
+            self.section_support.pop(name, None)
+            self.date_support.pop(name, None)
+
+    def set_default_collection(self, name, reload=False):
+        """
+        Atomically switches the collection served by default.
+        """
+        self.load_collection(name, reload=reload)
+        with self.lock:
+            previous = self.default_collection
+            self.default_collection = name
+        print(f"Default collection switched from '{previous}' to '{name}'")
+
+    def set_shadow_collection(self, name):
+        """
+        Starts comparing the retrieval of a candidate collection with the served one (None to stop).
+        """
+        if name:
+            self.load_collection(name)
+        self.shadow_collection = name
+
+    def has_sections(self, collection_name):
+        if collection_name not in self.section_support:
+            vectorstore = self.get_vectorstore(collection_name)
+            if self.local_index:
+                supported = vectorstore.store.has_sections
+            else:
+                supported = bool(vectorstore.get(where={"section": {"$in": CHAIR_SECTIONS}}, limit=1)["ids"])
+            self.section_support[collection_name] = supported
+        return self.section_support[collection_name]
+
+    def has_dates(self, collection_name):
+        """
+        Whether the period of a search can be filtered in the index. Local indexes filter the dates
+        of their text store, Chroma collections need the numeric dates added at indexing time.
+        """
+        if self.local_index:
+            return True
+        if collection_name not in self.date_support:
+            vectorstore = self.get_vectorstore(collection_name)
+            self.date_support[collection_name] = bool(vectorstore.get(where={"date_to": {"$gte": 0}}, limit=1)["ids"])
+        return self.date_support[collection_name]
+
+    def get_sections(self, question, collection_name):
+        """
+        Sections the retrieval of a question is restricted to, None for all of them.
+        """
+        if not (self.speaker_filter and self.has_sections(collection_name)):
+            return None
+        return chair_sections_filter(question)
+
+    def make_retriever(self, n_docs, collection_name=None, sections=None):
+        """
+        Returns a retriever of n_docs fragments with the configured search strategy.
+        With sections, only the fragments of those sections are candidates.
+        """
+        vectorstore = self.get_vectorstore(collection_name)
+
+        if self.rerank:
+            # The cross-encoder scores all the fetch_k candidates by relevance
+            search_type = "similarity"
+            search_kwargs = {"k": n_docs * 5}
+        else:
+            search_type = "mmr"
+            search_kwargs = {
+                "k": n_docs,
+                "fetch_k": n_docs * 5,
+                "lambda_mult": 0.7
+            }
+
+        if sections and self.local_index:
+            search_kwargs["sections"] = sections
+        elif sections:
+            search_kwargs["filter"] = {"section": {"$in": sections}}
+
+        if self.local_index:
+            retriever = vectorstore.as_retriever(self.embedding_model, search_type=search_type, search_kwargs=search_kwargs)
+        else:
+            retriever = vectorstore.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+
+        if self.rerank:
+            retriever = with_reranker(retriever, self.reranker, top_n=min(RERANK_TOP_N, n_docs))
+        return retriever
+
+    def get_retriever(self, n_docs, collection_name=None, sections=None):
+        # Multi-period questions are split into concurrent sub-retrievals sharing the k budget
+        if self.decompose:
+            return with_planner(lambda n: self.make_retriever(n, collection_name, sections), n_docs)
+        return self.make_retriever(n_docs, collection_name, sections)
+
+    def get_meetings(self, question):
+        # Aggregate questions use the precomputed meeting summaries of the requested period
+        if not self.meeting_summaries:
+            return []
+        return meetings_for_question(question)
+
+    def retrieve(self, question, collection_name=None, k=None, meetings=None):
+        """
+        Returns the fragments for a question from the requested (or default) collection.
+        """
+        # Resolved once, a hot-swap during the request does not mix collections
+        serves_default = collection_name is None
+        collection_name = collection_name or self.default_collection
+
+        if meetings is None:
+            meetings = self.get_meetings(question)
+        n_docs = k or (AGGREGATE_K if meetings else self.k)
+        sections = self.get_sections(question, collection_name)
+        docs = self.get_retriever(n_docs, collection_name, sections).invoke(question)
+
+        if self.shadow_collection and serves_default:
+            # The shadow queue is bounded, it must not compete with the served requests for the encoder
+            if self.shadow_slots.acquire(blocking=False):
+                self.shadow_executor.submit(self.run_shadow, question, n_docs, docs, collection_name)
+            else:
+                self.shadow_skipped += 1
+        return docs
+
+    def run_shadow(self, question, n_docs, served_docs, served_collection):
+        """
+        Retrieves the same question from the shadow collection and logs the comparison.
+        """
+        name = self.shadow_collection
+        try:
+            start = time.perf_counter()
+            docs = self.get_retriever(n_docs, name, self.get_sections(question, name)).invoke(question)
+            latency_ms = (time.perf_counter() - start) * 1000
+
+            served_pages = {(d.metadata.get('creationdate'), d.metadata.get('page')) for d in served_docs}
+            shadow_pages = {(d.metadata.get('creationdate'), d.metadata.get('page')) for d in docs}
+            overlap = len(served_pages & shadow_pages) / max(len(served_pages), 1)
+            self.shadow_log.append({
+                "question": question,
+                "served_collection": served_collection,
+                "shadow_collection": name,
+                "page_overlap": overlap,
+                "shadow_latency_ms": latency_ms,
+            })
+            print(f"[SHADOW] {name}: page overlap {overlap:.0%}, {latency_ms:.0f} ms")
+        except Exception as e:
+            print(f"[SHADOW] Retrieval failed on '{name}': {e}")
+        finally:
+            self.shadow_slots.release()
+
+    def search_by_vector(self, query_vector, n_docs, collection_name=None, sections=None,
+                         start_date=None, end_date=None, exclude=()):
+        """
+        MMR search with an already embedded query, restricted to a period.
+        Args:
+            query_vector (np.ndarray): Normalized query embedding.
+            n_docs (int): Fragments returned.
+            start_date, end_date (str): ISO dates of the period, None for all the dates.
+            exclude (set): Keys (see `doc_key`) of fragments that are already in the context.
+        Returns:
+            docs (list): New fragments of the period, at most n_docs.
+        """
+        vectorstore = self.get_vectorstore(collection_name)
+        period = SubQuery("", start_date, end_date)
+        k = n_docs + len(exclude)
+
+        if self.local_index:
+            # Exact search over the fragments of the period only
+            subset = vectorstore.store.date_positions(start_date, end_date) if start_date else np.arange(len(vectorstore))
+            if sections:
+                subset = np.intersect1d(subset, vectorstore.store.filter_positions(sections))
+            positions, scores = vectorstore.search_subset(query_vector, k * 5, subset)
+            selected = maximal_marginal_relevance(query_vector, vectorstore.get_vectors(positions), k, 0.7)
+            docs = vectorstore.get_documents(positions[selected], scores[selected])
+        else:
+            filters = [{"section": {"$in": sections}}] if sections else []
+            dated = start_date is not None and self.has_dates(collection_name or self.default_collection)
+            if dated:
+                # Chunks whose meetings overlap the period, the exact dates of their sources are checked below
+                filters += [{"date_from": {"$lte": date_number(end_date)}}, {"date_to": {"$gte": date_number(start_date)}}]
+            # Without numeric dates, candidates are overfetched and filtered like the planner does
+            fetch = k if dated or start_date is None else k * OVERFETCH
+            docs = vectorstore.max_marginal_relevance_search_by_vector(
+                query_vector.tolist(),
+                k=fetch,
+                fetch_k=fetch * 5,
+                lambda_mult=0.7,
+                filter=({"$and": filters} if len(filters) > 1 else filters[0]) if filters else None
+            )
+            docs = [doc for doc in docs if period.in_period(doc)]
+
+        return [doc for doc in docs if doc_key(doc) not in exclude][:n_docs]
+
+    def follow_up_docs(self, state, collection_name, follow_up, sub_query, n_docs):
+        """
+        Fragments of one period of a follow-up, searched with the query vector of the topic of the
+        conversation (embedded once per topic). On the same subject, the fragments of the period
+        already retrieved are kept and only the missing ones are searched. On another subject,
+        the cached fragments were retrieved for the previous one and are not reused.
+        """
+        if follow_up.search:
+            docs, exclude = [], set()
+        else:
+            docs = [doc for doc in state.docs if sub_query.in_period(doc)][:n_docs]
+            if len(docs) == n_docs:
+                return docs
+            exclude = set(state.fragments)
+
+        if state.query_vector is None:
+            state.query_vector = np.asarray(self.embedding_model.embed_query(state.topic), dtype=np.float32)
+        query_vector = state.query_vector
+        if sub_query.start_date is not None and not self.has_dates(collection_name):
+            # The period can not be filtered in the search, it stays in the embedded question
+            query_vector = np.asarray(self.embedding_model.embed_query(sub_query.query), dtype=np.float32)
+        return docs + self.search_by_vector(
+            query_vector, n_docs - len(docs), collection_name, self.get_sections(sub_query.query, collection_name),
+            sub_query.start_date, sub_query.end_date, exclude=exclude
+        )
+
+    def session_context(self, question, session_id, collection_name=None):
+        """
+        Context of a question asked in a conversation.
+        A follow-up ("and what about June?") reuses the fragments and query vector of the
+        previous questions: fragments of the new period already retrieved are kept (narrowing),
+        only the missing ones are searched, and their formatted text is cached in the session.
+        A follow-up on another subject ("and what about the labor market?", "and inflation in June?")
+        searches the new subject in its own period, or in the period of the conversation. Compared
+        periods ("and 2023 versus 2019?") get an equal share of the fragments each. Only an
+        elaboration ("why?", "tell me more") is answered from the previous context.
+        Returns:
+            question (str): Stand-alone question sent to the LLM.
+            context (str): Context of the question.
+        """
+        name = collection_name or self.default_collection
+        state = self.sessions.get(session_id)
+        follow_up = plan_follow_up(state, question) if state and state.collection_name == name else None
+
+        if follow_up is None:
+            # New topic: regular retrieval, the conversation starts over
+            meetings = self.get_meetings(question)
+            docs = self.retrieve(question, collection_name, meetings=meetings)
+            state = SessionState.start(question, name)
+            self.sessions.put(session_id, state)
+        else:
+            question = follow_up.query
+            meetings = self.get_meetings(question)
+            n_docs = AGGREGATE_K if meetings else self.k
+            if follow_up.elaboration:
+                docs = state.last_docs
+            else:
+                state.ask(follow_up)
+                sub_queries = follow_up.sub_queries or [follow_up]
+                quota = math.ceil(n_docs / len(sub_queries))
+                results = [self.follow_up_docs(state, name, follow_up, sub_query, quota) for sub_query in sub_queries]
+                docs = merge_results(sub_queries, results, n_docs) if len(sub_queries) > 1 else results[0]
+
+        state.add(docs)
+        context = state.build_context(docs)
+        if meetings:
+            context = format_meetings(meetings) + "\n\n" + context
+        return question, context
+
+    def build_context(self, docs, meetings):
+        context = format_docs(docs)
+        if meetings:
+            context = format_meetings(meetings) + "\n\n" + context
+        return context
+
+    def generation_chain(self):
+        """
+        End of the RAG chain: from {"context", "question"} to the raw text generated by the LLM.
+        """
+        return self.prompt | self.llm.bind(stop=["Human:", "System:"]) | StrOutputParser()
+
+    def build_chain(self, question, collection_name=None, session_id=None):
+        """
+        RAG chain of a question up to the raw text generated by the LLM.
+        With a session id, the question can follow up on the previous ones of the session.
+        """
+        if session_id is not None:
+            question, context = self.session_context(question, session_id, collection_name)
+            return RunnableLambda(lambda inputs: {"context": context, "question": question}) | self.generation_chain()
+
+        meetings = self.get_meetings(question)
+
+        return (
+        {
+            # Extract the string first before giving it to the retriever
+            "context": itemgetter("question")
+                | RunnableLambda(lambda q: self.retrieve(q, collection_name, meetings=meetings))
+                | RunnableLambda(lambda docs: self.build_context(docs, meetings)),
+            "question": itemgetter("question")
+        }
+        | self.generation_chain()
+        )
+
+    def answer(self, question, collection_name=None, session_id=None):
+        """
+        Runs the RAG chain for a question.
+        Args:
+            question (str): User question.
+            collection_name (str): Collection to route the request to, the default one if None.
+            session_id (str): Conversation of the question, to answer follow-ups incrementally.
+        Returns:
+            answer (dict): Typed response ("Answer", "Sentiment", "Evidence").
+        """
+        rag_chain = self.build_chain(question, collection_name, session_id) | RunnableLambda(parse_response)
+
+        return rag_chain.invoke({"question": question})
+
+    def stream(self, question, collection_name=None, session_id=None):
+        """
+        Runs the RAG chain for a question and yields the raw text as the LLM generates it.
+        The joined text is parsed with `parse_response`, like the output of `answer`.
+        """
+        yield from self.build_chain(question, collection_name, session_id).stream({"question": question})
+
+    def close(self):
+        self.shadow_executor.shutdown(wait=False)
+        if hasattr(self.embedding_model, "close"):
+            self.embedding_model.close()
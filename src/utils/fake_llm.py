@@ -0,0 +1,107 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import json
+import time
+import uuid
+
+# Default answer, a valid RAG response so the whole pipeline (parsing included) is exercised
+FAKE_RESPONSE = json.dumps({
+    "Answer": "The Committee kept the target range unchanged and described inflation as elevated but easing, "
+              "while noting that the labor market remains solid and that future decisions depend on incoming data.",
+    "Sentiment": "Neutral",
+    "Evidence": [
+        "inflation has eased substantially but remains somewhat elevated",
+        "the labor market remains solid",
+    ],
+})
+
+
+def split_tokens(text):
+    """
+    Approximates the tokens of a text by its words (with their trailing space).
+    """
+    words = text.split(" ")
+    return [word + " " for word in words[:-1]] + [words[-1]]
+
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    """
+    OpenAI-compatible chat completions endpoint (the API used by ChatGroq), streaming or not.
+    The server attributes `latency_ms` (time to first token) and `tokens_per_second` pace the answer.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = body.get("model", "fake")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        tokens = split_tokens(self.server.response)
+        delay = 1 / self.server.tokens_per_second if self.server.tokens_per_second else 0.0
+
+        time.sleep(self.server.latency_ms / 1000)
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(delay)
+                self.send_event(self.chunk(completion_id, model, {"role": "assistant", "content": token} if i == 0 else {"content": token}))
+            self.send_event(self.chunk(completion_id, model, {}, finish_reason="stop"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        time.sleep(delay * max(len(tokens) - 1, 0))
+        payload = json.dumps({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.server.response}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def chunk(self, completion_id, model, delta, finish_reason=None):
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def send_event(self, data):
+        self.wfile.write(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def serve_fake_llm(host="127.0.0.1", port=8090, latency_ms=500.0, tokens_per_second=50.0, response=FAKE_RESPONSE):
+    """
+    Runs a local stand-in of the Groq API until the process is stopped.
+    Point ChatGroq to it with GROQ_API_BASE=http://{host}:{port}.
+    Args:
+        latency_ms (float): Delay before the first token.
+        tokens_per_second (float): Generation speed after the first token (0 for no delay).
+        response (str): Text returned to every request.
+    """
+    server = ThreadingHTTPServer((host, port), FakeChatHandler)
+    server.daemon_threads = True
+    server.latency_ms = latency_ms
+    server.tokens_per_second = tokens_per_second
+    server.response = response
+    server.serve_forever()
@@ -1,38 +1,150 @@
+from pydantic import BaseModel, ConfigDict, Field
+from enum import Enum
 import json_repair
-from langchain_core.output_parsers import JsonOutputParser
+import json
+import re
+
+from .text_store import Fragment, format_header
+
+# Reused by every call instead of building a new parser per response
+JSON_DECODER = json.JSONDecoder()
+CODE_FENCE_PATTERN = re.compile(r"```(?:json)?", re.IGNORECASE)
+# "2008: Neutral", "post-2008 - Neutral" ...
+PERIOD_SENTIMENT_PATTERN = re.compile(r"([^:;,|\n]+?)\s*[:\-]\s*\**(Hawkish|Neutral|Dovish)\b", re.IGNORECASE)
+SENTIMENT_PATTERN = re.compile(r"\b(Hawkish|Neutral|Dovish)\b", re.IGNORECASE)
+
+# Keys of the typed response
+ANSWER_KEY = "Answer"
+SENTIMENT_KEY = "Sentiment"
+EVIDENCE_KEY = "Evidence"
+
+
+class Sentiment(str, Enum):
+    HAWKISH = "Hawkish"
+    NEUTRAL = "Neutral"
+    DOVISH = "Dovish"
+
+
+class RAGResponse(BaseModel):
+    """
+    Structured answer of the RAG chain.
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    answer: str = Field(default="", alias=ANSWER_KEY, description="Concise and factual answer, starting with the year(s) found in the headers.")
+    sentiment: Sentiment | dict[str, Sentiment] | None = Field(
+        default=None,
+        alias=SENTIMENT_KEY,
+        description="Hawkish, Neutral or Dovish. For multi-period comparisons, an object with one classification per period."
+    )
+    evidence: list[str] = Field(default_factory=list, alias=EVIDENCE_KEY, description="Direct quotes followed by their citation [Date | Page].")
+
+
+def extract_json_object(text):
+    """
+    Strips code fences and decodes the first complete {...} object of the text.
+    Text after the object (even with braces, or a second object) is ignored.
+    Returns:
+        data (dict): The decoded object, None if the text has no complete object.
+    """
+    text = CODE_FENCE_PATTERN.sub("", text)
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, _ = JSON_DECODER.raw_decode(text, start)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+        # Braces in the text before the object, e.g. "{this}"
+        start = text.find("{", start + 1)
+    return None
 
 def parse_with_fixer(text):
-    parser = JsonOutputParser()
-    
-    try:
-        # Normal parsing attempt
-        json_output = parser.parse(text)
-
-        return json_output
-    
-    except Exception as e:
-        # Fallback using json_repair
-        json_fixed = json_repair.loads(text)
-        
-        return json_fixed
-    
+    data = extract_json_object(text)
+    if data is not None:
+        return data
+
+    # Fallback using json_repair, only for malformed outputs
+    text = CODE_FENCE_PATTERN.sub("", text)
+    start = text.find("{")
+    return json_repair.loads(text[start:] if start != -1 else text.strip())
+
+def find_key(data, name):
+    # The LLM sometimes uses longer keys like "Sentiment Classification" or "Key Evidence"
+    if name in data:
+        return data[name]
+    for key, value in data.items():
+        if name.lower() in key.lower():
+            return value
+    return None
+
+def normalize_sentiment(value):
+    if isinstance(value, dict):
+        labels = {str(period): normalize_sentiment(label) for period, label in value.items()}
+        return {period: label for period, label in labels.items() if isinstance(label, Sentiment)} or None
+
+    text = str(value or "")
+    # One classification per period, e.g. "2008: Neutral; 2020: Dovish"
+    per_period = PERIOD_SENTIMENT_PATTERN.findall(text)
+    if len(per_period) > 1:
+        return {period.strip(" *-"): Sentiment(label.capitalize()) for period, label in per_period}
+
+    match = SENTIMENT_PATTERN.search(text)
+    return Sentiment(match.group(1).capitalize()) if match else None
+
+def normalize_evidence(value):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    # Items may come as {"quote": ..., "citation": ...} objects
+    return [" ".join(str(v) for v in item.values()) if isinstance(item, dict) else str(item) for item in value]
+
+def parse_response(text):
+    """
+    Parses the RAG chain output into the typed response.
+    Returns:
+        response (dict): Typed keys "Answer", "Sentiment" and "Evidence".
+    """
+    data = parse_with_fixer(text)
+    if not isinstance(data, dict):
+        data = {ANSWER_KEY: str(data)}
+
+    response = RAGResponse(
+        answer=str(find_key(data, ANSWER_KEY) or ""),
+        sentiment=normalize_sentiment(find_key(data, SENTIMENT_KEY)),
+        evidence=normalize_evidence(find_key(data, EVIDENCE_KEY)),
+    )
+    return response.model_dump(mode="json", by_alias=True)
+
+def format_sentiment(sentiment):
+    """
+    Formats the Sentiment field of a parsed response for display.
+    """
+    if not sentiment:
+        return "Information not found in the context."
+    if isinstance(sentiment, dict):
+        return " | ".join(f"{period}: {label}" for period, label in sentiment.items())
+    return str(sentiment)
+
 
 def format_docs(docs):
     formatted = []
     # Iterate through documents, extract metadata and content
     for doc in docs:
-        # Extract metadata
-        meta = doc.metadata
-        date = meta.get('creationdate', 'Unknown Date')
-        page = meta.get('page', '?')
-        total_pages = meta.get('total_pages', '?')
+        # Records of a local index are already normalized, only the selected ones are read
+        if isinstance(doc, Fragment):
+            formatted.append(doc.format())
+            continue
 
         # Clean content by replacing newlines with spaces
         content = doc.page_content.replace("\n", " ")
 
-        formatted.append(f"FRAGMENT [Date: {date} | Page: {page} of {total_pages}] \n{content}")
+        # Header from the metadata: date, page and section
+        formatted.append(f"{format_header(doc.metadata)}\n{content}")
 
     # Combine all formatted documents into a single context string separated by double newlines
     context = "\n\n".join(formatted)
 
-    return context
\ No newline at end of file
+    return context
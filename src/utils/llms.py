@@ -1,35 +1,68 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline, BitsAndBytesConfig
-from langchain_huggingface import HuggingFacePipeline
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
-import torch
+# torch, transformers and the model clients are imported by the loaders that use them,
+# so importing this module does not pay for the stacks a process never loads
+import os
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def load_model():
+# Query encoder used at serving time: "torch" (float32 PyTorch), "onnx" or "onnx-int8"
+QUERY_ENCODER_MODE = os.getenv("QUERY_ENCODER_MODE", "torch")
+QUERY_ENCODER_MODES = ["torch", "onnx", "onnx-int8"]
+
+# Settings of the answer and judge models, also part of the keys of the experiment recordings
+LLM_SETTINGS = {
+    "model": "meta-llama/llama-4-scout-17b-16e-instruct",
+    "temperature": 0.25,
+    "max_tokens": None,
+}
+JUDGE_SETTINGS = {
+    "model": "Qwen/Qwen2.5-7B-Instruct",
+    "quantization": "nf4",
+    "max_new_tokens": 512,
+    "temperature": 0.001,
+}
+
+def load_model(timeout=None, max_connections=None):
+    """
+    Args:
+        timeout (float): Seconds before a call to the Groq API fails, None to wait.
+        max_connections (int): Size of the HTTP connection pool shared by the calls, the client default if None.
+    """
+    from langchain_groq import ChatGroq
+
+    http_client = None
+    if max_connections:
+        import httpx
+
+        # Keep-alive connections are reused by the concurrent requests of a server
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        http_client = httpx.Client(limits=limits, timeout=timeout)
+
     llm = ChatGroq(
-        model="meta-llama/llama-4-scout-17b-16e-instruct",
-        temperature=0.25,
-        max_tokens=None,
-        timeout=None,
+        **LLM_SETTINGS,
+        timeout=timeout,
         max_retries=3,
+        http_client=http_client,
         )   
     return llm
 
 def load_judge_model():
+    from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline, BitsAndBytesConfig
+    from langchain_huggingface import HuggingFacePipeline
+    import torch
+
     # Configure 4-bit quantization, the 16-bit version does not fit in my gpu (12GB)
     bnb_config = BitsAndBytesConfig(
         load_in_4bit=True,
-        bnb_4bit_quant_type="nf4",
+        bnb_4bit_quant_type=JUDGE_SETTINGS["quantization"],
         # Gemma was trained with bfloat16: 1 sign bit, 8 exponent bits, 7 mantissa bits
         bnb_4bit_compute_dtype=torch.bfloat16,
         # Scales reduced from 16 bit to 4 bit too
         bnb_4bit_use_double_quant=True,
     )
 
-    model_id = "Qwen/Qwen2.5-7B-Instruct"
+    model_id = JUDGE_SETTINGS["model"]
     tokenizer = AutoTokenizer.from_pretrained(model_id)
     model = AutoModelForCausalLM.from_pretrained(
         model_id,
@@ -41,8 +74,8 @@ def load_judge_model():
         "text-generation",
         model=model,
         tokenizer=tokenizer,
-        max_new_tokens=512,
-        temperature=0.001,
+        max_new_tokens=JUDGE_SETTINGS["max_new_tokens"],
+        temperature=JUDGE_SETTINGS["temperature"],
         return_full_text=False
     )
 
@@ -51,10 +84,49 @@ def load_judge_model():
 
     return llm
 
-def load_embedding_model(device="cpu"):
-    embedding_model = HuggingFaceEmbeddings(
-        model_name="BAAI/bge-large-en-v1.5",
-        model_kwargs={'device': device},
-        encode_kwargs={'normalize_embeddings': True}
+def load_embedding_model(device="cpu", mode="torch", micro_batch=False):
+    """
+    Loads the bge-large query encoder.
+    The ONNX modes use the encoder exported by src/export_query_encoder.py, which
+    shares the vector space of the PyTorch model.
+    With micro_batch, concurrent queries are encoded together in batched forward passes
+    (for long-lived models shared by several users or workers).
+    """
+    if mode not in QUERY_ENCODER_MODES:
+        raise ValueError(f"Unknown query encoder mode: {mode}. Use one of {QUERY_ENCODER_MODES}")
+
+    if mode != "torch":
+        from .encoders import ONNXEmbeddings
+        embedding_model = ONNXEmbeddings(quantized=(mode == "onnx-int8"))
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        embedding_model = HuggingFaceEmbeddings(
+            model_name="BAAI/bge-large-en-v1.5",
+            model_kwargs={'device': device},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+
+    if micro_batch:
+        from .batching import MicroBatchEmbeddings
+        embedding_model = MicroBatchEmbeddings(embedding_model)
+
+    return embedding_model
+
+def load_reranker_model(device="cpu"):
+    # Small local cross-encoder (22M parameters) for the rerank stage
+    from sentence_transformers import CrossEncoder
+
+    reranker_model = CrossEncoder(
+        "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        device=device
     )
-    return embedding_model
\ No newline at end of file
+    return reranker_model
+
+def get_device():
+    """
+    Returns "cuda" when a GPU is available. Only imports torch when called.
+    """
+    import torch
+
+    return "cuda" if torch.cuda.is_available() else "cpu"
@@ -0,0 +1,306 @@
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from pydantic import Field
+from typing import Any
+import numpy as np
+import joblib
+import json
+import time
+import os
+
+from .text_store import TextStore, Fragment, build_text_store, TEXTS_FILE
+
+# Files of a collection exported from Chroma
+VECTORS_FILE = "vectors.npy"
+PARAMS_FILE = "params.json"
+# Texts and metadata of the exports made before the text store
+LEGACY_DOCUMENTS_FILE = "documents.pkl"
+
+
+def export_collection(client, collection_name, index_dir, batch_size=5000):
+    """
+    Exports the embeddings, texts and metadata of a Chroma collection to a local directory.
+    The float32 vectors are stored as a .npy file and the texts in a text store, so both can be memory-mapped.
+    Args:
+        client: Chroma client instance.
+        collection_name (str): Name of the Chroma collection.
+        index_dir (str): Output directory.
+        batch_size (int): Number of records fetched from Chroma per request.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    collection = client.get_collection(collection_name)
+    total = collection.count()
+
+    ids, texts, metadatas, vectors = [], [], [], []
+    for offset in range(0, total, batch_size):
+        batch = collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=batch_size,
+            offset=offset
+        )
+        ids.extend(batch["ids"])
+        texts.extend(batch["documents"])
+        metadatas.extend(batch["metadatas"])
+        vectors.append(np.asarray(batch["embeddings"], dtype=np.float32))
+
+    np.save(os.path.join(index_dir, VECTORS_FILE), np.concatenate(vectors))
+    build_text_store(index_dir, ids, texts, metadatas)
+    save_params(index_dir, {"collection_name": collection_name, "count": total})
+
+    print(f"Collection '{collection_name}' exported to '{index_dir}' ({total} vectors)")
+
+def migrate_documents(index_dir):
+    """
+    Builds the text store of an index exported with the former documents.pkl layout.
+    """
+    ids, texts, metadatas = joblib.load(os.path.join(index_dir, LEGACY_DOCUMENTS_FILE))
+    build_text_store(index_dir, ids, texts, metadatas)
+    print(f"Text store built for '{index_dir}'")
+
+def save_params(index_dir, params):
+    """
+    Merges the given parameters into the params file of the index directory.
+    """
+    path = os.path.join(index_dir, PARAMS_FILE)
+    current = load_params(index_dir)
+    current.update(params)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+
+def load_params(index_dir):
+    path = os.path.join(index_dir, PARAMS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def top_k(scores, k):
+    """
+    Returns the positions of the k highest scores, sorted from best to worst.
+    """
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    positions = np.argpartition(-scores, k - 1)[:k]
+    return positions[np.argsort(-scores[positions])]
+
+def maximal_marginal_relevance(query_vector, candidate_vectors, k, lambda_mult=0.5):
+    """
+    Selects k candidates balancing relevance to the query and diversity among them.
+    Vectors are expected to be normalized, so the dot product is the cosine similarity.
+    Returns:
+        selected (list): Positions in candidate_vectors, in selection order.
+    """
+    if len(candidate_vectors) == 0:
+        return []
+
+    relevance = candidate_vectors @ query_vector
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of each candidate to any of the already selected ones
+    redundancy = candidate_vectors @ candidate_vectors[selected[0]]
+
+    while len(selected) < min(k, len(candidate_vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, candidate_vectors @ candidate_vectors[best])
+
+    return selected
+
+def batch_top_k(scores, k):
+    """
+    Row-wise `top_k` of a (queries, vectors) score matrix.
+    """
+    k = min(k, scores.shape[1])
+    positions = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, positions, axis=1), axis=1)
+    return np.take_along_axis(positions, order, axis=1)
+
+def batch_maximal_marginal_relevance(query_vectors, candidate_vectors, k, lambda_mult=0.5):
+    """
+    `maximal_marginal_relevance` for a batch of queries at once.
+    Args:
+        query_vectors (np.ndarray): (queries, dim) matrix.
+        candidate_vectors (np.ndarray): (queries, candidates, dim) candidates of each query.
+    Returns:
+        selected (np.ndarray): (queries, k) positions in the candidates of each query, in selection order.
+    """
+    n_queries, n_candidates, _ = candidate_vectors.shape
+    rows = np.arange(n_queries)
+    relevance = np.einsum("qcd,qd->qc", candidate_vectors, query_vectors)
+    similarities = candidate_vectors @ candidate_vectors.transpose(0, 2, 1)
+
+    best = np.argmax(relevance, axis=1)
+    selected = [best]
+    chosen = np.zeros((n_queries, n_candidates), dtype=bool)
+    chosen[rows, best] = True
+    redundancy = similarities[rows, best]
+
+    while len(selected) < min(k, n_candidates):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[chosen] = -np.inf
+        best = np.argmax(scores, axis=1)
+        selected.append(best)
+        chosen[rows, best] = True
+        redundancy = np.maximum(redundancy, similarities[rows, best])
+
+    return np.stack(selected, axis=1)
+
+def sample_query_vectors(index, n_queries, seed=0):
+    """
+    Samples stored chunk vectors to use them as benchmark queries.
+    Returns:
+        query_vectors (list): (position, vector) tuples.
+    """
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(index), size=min(n_queries, len(index)), replace=False)
+    return [(int(p), np.asarray(index.vectors[p], dtype=np.float32)) for p in sample]
+
+def evaluate_recall(index, baseline, query_vectors, k, **search_kwargs):
+    """
+    Compares an index against the exact float32 baseline.
+    The chunk used as query is excluded from both result lists.
+    Returns:
+        recall (float): Mean recall@k against the exact search.
+        latency_ms (float): Mean search latency in milliseconds.
+    """
+    recalls, latencies = [], []
+    for position, query_vector in query_vectors:
+        exact, _ = baseline.search(query_vector, k + 1)
+        start = time.perf_counter()
+        approximate, _ = index.search(query_vector, k + 1, **search_kwargs)
+        latencies.append(time.perf_counter() - start)
+
+        exact = [p for p in exact if p != position][:k]
+        approximate = [p for p in approximate if p != position][:k]
+        recalls.append(len(set(exact) & set(approximate)) / max(len(exact), 1))
+
+    return float(np.mean(recalls)), float(np.mean(latencies)) * 1000
+
+
+class LocalIndex:
+    """
+    Exact (brute force) float32 index over a collection exported with `export_collection`.
+    Subclasses override `search` with faster approximate strategies.
+    """
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.params = load_params(index_dir)
+        # Memory-mapped, only the rows that are used are read from disk
+        self.vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r")
+        if not os.path.exists(os.path.join(index_dir, TEXTS_FILE)):
+            migrate_documents(index_dir)
+        self.store = TextStore(index_dir)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, query_vector, k):
+        """
+        Returns the positions and scores of the k nearest vectors to the query.
+        """
+        scores = self.vectors @ query_vector
+        positions = top_k(scores, k)
+        return positions, scores[positions]
+
+    def search_subset(self, query_vector, k, subset):
+        """
+        Exact search restricted to the given positions (e.g. the fragments of some sections).
+        """
+        scores = self.get_vectors(subset) @ query_vector
+        positions = top_k(scores, k)
+        return subset[positions], scores[positions]
+
+    def search_batch(self, query_vectors, k, block_size=256, subset=None):
+        """
+        Exact search of a batch of queries with one matrix product per block of queries.
+        With subset, only those positions are searched.
+        Returns:
+            positions, scores (np.ndarray): (queries, k) matrices, sorted from best to worst.
+        """
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        vectors = self.vectors if subset is None else self.get_vectors(subset)
+        positions, scores = [], []
+        for i in range(0, len(query_vectors), block_size):
+            block_scores = query_vectors[i : i + block_size] @ vectors.T
+            block_positions = batch_top_k(block_scores, k)
+            positions.append(block_positions if subset is None else subset[block_positions])
+            scores.append(np.take_along_axis(block_scores, block_positions, axis=1))
+        return np.concatenate(positions), np.concatenate(scores)
+
+    def mmr_batch(self, query_vectors, k, fetch_k, lambda_mult=0.5, subset=None):
+        """
+        MMR search of a batch of queries, like the "mmr" retriever but vectorized over the queries.
+        Returns:
+            positions, scores (np.ndarray): (queries, k) matrices in selection order.
+        """
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        positions, scores = self.search_batch(query_vectors, fetch_k, subset=subset)
+        candidates = self.get_vectors(positions.ravel()).reshape(*positions.shape, -1)
+        selected = batch_maximal_marginal_relevance(query_vectors, candidates, k, lambda_mult)
+        return np.take_along_axis(positions, selected, axis=1), np.take_along_axis(scores, selected, axis=1)
+
+    def get_vectors(self, positions):
+        # Sorted access keeps memory-mapped reads sequential
+        order = np.argsort(positions)
+        vectors = np.empty((len(positions), self.vectors.shape[1]), dtype=np.float32)
+        vectors[order] = self.vectors[np.asarray(positions)[order]]
+        return vectors
+
+    def get_documents(self, positions, scores=None):
+        """
+        Returns lazy Fragment records, the texts are only read for the fragments that reach the prompt.
+        """
+        if scores is None:
+            return [Fragment(self.store, i) for i in positions]
+        return [Fragment(self.store, i, float(score)) for i, score in zip(positions, scores)]
+
+    def memory_bytes(self):
+        """
+        Bytes scanned by a search (the vector storage).
+        """
+        return self.vectors.nbytes
+
+    def as_retriever(self, embedding_model, search_type="similarity", search_kwargs=None):
+        return LocalIndexRetriever(
+            index=self,
+            embedding_model=embedding_model,
+            search_type=search_type,
+            search_kwargs=search_kwargs or {}
+        )
+
+
+class LocalIndexRetriever(BaseRetriever):
+    """
+    LangChain retriever over a LocalIndex, with the same search types and
+    search_kwargs used with the Chroma retriever ("similarity" and "mmr").
+    search_kwargs["sections"] restricts the search to the fragments of those sections.
+    """
+    index: Any
+    embedding_model: Any
+    search_type: str = "similarity"
+    search_kwargs: dict = Field(default_factory=dict)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Fragment]:
+        query_vector = np.asarray(self.embedding_model.embed_query(query), dtype=np.float32)
+        k = self.search_kwargs.get("k", 4)
+
+        sections = self.search_kwargs.get("sections")
+        if sections:
+            # Pre-filter: only the candidates of the sections are scored (exactly)
+            subset = self.index.store.filter_positions(sections)
+            search = lambda q, n: self.index.search_subset(q, n, subset)
+        else:
+            search = self.index.search
+
+        if self.search_type == "mmr":
+            fetch_k = self.search_kwargs.get("fetch_k", 20)
+            lambda_mult = self.search_kwargs.get("lambda_mult", 0.5)
+            positions, scores = search(query_vector, fetch_k)
+            selected = maximal_marginal_relevance(query_vector, self.index.get_vectors(positions), k, lambda_mult)
+            positions, scores = positions[selected], scores[selected]
+        else:
+            positions, scores = search(query_vector, k)
+
+        return self.index.get_documents(positions, scores)
@@ -0,0 +1,98 @@
+import sqlite3
+import json
+import os
+import re
+
+from .periods import extract_periods
+
+# Precomputed per-meeting table (see data/summarize_meetings.py), resolved from the repository
+# root so the builder (run from data/) and the engine (run from the root) share the same file
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+MEETINGS_DB = os.path.join(REPO_ROOT, "data", "summaries", "meetings.sqlite3")
+
+# Questions about the overall tone of one or more periods
+AGGREGATE_PATTERN = re.compile(r"\b(sentiment|tone|stance|evolv\w*|evolution|trend|shift\w*|overall|press releases|press conferences)\b", re.IGNORECASE)
+
+
+def connect(db_path=MEETINGS_DB):
+    """
+    Opens the meetings database, creating the table if needed.
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS meetings (
+            date TEXT PRIMARY KEY,
+            sentiment TEXT,
+            summary TEXT,
+            key_quotes TEXT,
+            total_pages INTEGER,
+            model TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return conn
+
+def meeting_exists(conn, date):
+    return conn.execute("SELECT 1 FROM meetings WHERE date = ?", (date,)).fetchone() is not None
+
+def save_meeting(conn, date, sentiment, summary, key_quotes, total_pages, model):
+    conn.execute(
+        "INSERT OR REPLACE INTO meetings (date, sentiment, summary, key_quotes, total_pages, model) VALUES (?, ?, ?, ?, ?, ?)",
+        (date, sentiment, summary, json.dumps(key_quotes), total_pages, model)
+    )
+    conn.commit()
+
+def load_meetings(start_date, end_date, db_path=MEETINGS_DB):
+    """
+    Returns the meetings between two ISO dates (both included), sorted by date.
+    An empty list is returned if the table has not been built.
+    """
+    if not os.path.exists(db_path):
+        return []
+
+    conn = connect(db_path)
+    rows = conn.execute(
+        "SELECT date, sentiment, summary, key_quotes FROM meetings WHERE date BETWEEN ? AND ? ORDER BY date",
+        (start_date, end_date)
+    ).fetchall()
+    conn.close()
+
+    return [{**dict(row), "key_quotes": json.loads(row["key_quotes"] or "[]")} for row in rows]
+
+def is_aggregate_question(question):
+    return AGGREGATE_PATTERN.search(question) is not None
+
+def meetings_for_question(question, db_path=MEETINGS_DB):
+    """
+    Returns the meeting summaries of the periods of an aggregate question, an empty list otherwise.
+    Each period is loaded on its own, "post-2008 versus 2020" does not include the years in between.
+    """
+    periods = extract_periods(question)
+    if not (periods and is_aggregate_question(question)):
+        return []
+
+    meetings = {}
+    for _, start_date, end_date in periods:
+        for meeting in load_meetings(start_date, end_date, db_path=db_path):
+            meetings.setdefault(meeting["date"], meeting)
+    meetings = [meetings[date] for date in sorted(meetings)]
+    if meetings:
+        labels = ", ".join(label for label, _, _ in periods)
+        print(f"Using {len(meetings)} meeting summaries of {labels}.")
+    return meetings
+
+def format_meetings(meetings):
+    """
+    Formats the meeting records with a header per meeting, like `format_docs` does with fragments.
+    """
+    formatted = []
+    for meeting in meetings:
+        quotes = " | ".join(f'"{quote}"' for quote in meeting["key_quotes"])
+        formatted.append(
+            f"MEETING SUMMARY [Date: {meeting['date']}] Sentiment: {meeting['sentiment']}\n"
+            f"{meeting['summary']}\nKey quotes: {quotes}"
+        )
+
+    return "\n\n".join(formatted)
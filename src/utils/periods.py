@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+import calendar
+import re
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+
+# Month ranges of the qualifiers that can precede a year
+QUALIFIERS = {
+    "early": (1, 4),
+    "beginning of": (1, 4),
+    "mid": (5, 8),
+    "late": (9, 12),
+    "end of": (9, 12),
+    "first half of": (1, 6),
+    "second half of": (7, 12),
+    "q1": (1, 3),
+    "q2": (4, 6),
+    "q3": (7, 9),
+    "q4": (10, 12),
+}
+
+# Periods relative to a year: "since 2022" is open ended, "after 2019" and "post-2008"
+# cover the aftermath window of the following AFTERMATH_YEARS years
+OPEN_QUALIFIERS = ["since", "after", "post"]
+AFTERMATH_YEARS = 3
+
+PERIOD_PATTERN = re.compile(
+    r"(?:\b(?P<qualifier>" + "|".join(sorted(QUALIFIERS, key=len, reverse=True) + OPEN_QUALIFIERS + list(MONTHS)) + r")[\s-]+)?"
+    r"\b(?P<year>(?:19|20)\d{2})\b(?:\s*\((?P<suffix>q[1-4])\))?",
+    re.IGNORECASE
+)
+# Words joining the two ends of a range: "from 2015 to 2018", "between 2015 and 2018", "2015-2018"
+RANGE_CONNECTOR_PATTERN = re.compile(r"^\s*(?:-|–|to|until|till|through)\s*$", re.IGNORECASE)
+BETWEEN_CONNECTOR_PATTERN = re.compile(r"^\s*and\s*$", re.IGNORECASE)
+BETWEEN_PATTERN = re.compile(r"\bbetween\s*$", re.IGNORECASE)
+# Capitalized month names without a year ("and what about June?"), only resolved in a conversation
+BARE_MONTH_PATTERN = re.compile(
+    r"\b(" + "|".join(name for name in calendar.month_name if name) + r")\b(?![\s-]*(?:19|20)\d{2})"
+)
+
+
+def month_range(year, first_month, last_month):
+    last_day = calendar.monthrange(year, last_month)[1]
+    return f"{year}-{first_month:02d}-01", f"{year}-{last_month:02d}-{last_day:02d}"
+
+def extract_periods(question, default_year=None):
+    """
+    Finds the periods mentioned in a question, e.g. "2008", "early 2024", "June 2025", "post-2008".
+    Args:
+        default_year (int): Year of the months named without one, e.g. the year discussed so far
+            in a conversation. Months without a year are ignored if not given.
+    Returns:
+        periods (list): (label, start_date, end_date) tuples with ISO dates, in order of appearance.
+    """
+    # (start_date, end_date, start and end of the label in the question)
+    matches = []
+    for match in PERIOD_PATTERN.finditer(question):
+        year = int(match.group("year"))
+        qualifier = (match.group("qualifier") or match.group("suffix") or "").lower()
+
+        if qualifier in QUALIFIERS:
+            start, end = month_range(year, *QUALIFIERS[qualifier])
+        elif qualifier in MONTHS:
+            start, end = month_range(year, MONTHS[qualifier], MONTHS[qualifier])
+        elif qualifier == "since":
+            start, end = f"{year}-01-01", "9999-12-31"
+        elif qualifier in OPEN_QUALIFIERS:
+            start, end = f"{year + 1}-01-01", f"{year + AFTERMATH_YEARS}-12-31"
+        else:
+            start, end = month_range(year, 1, 12)
+        matches.append((start, end, match.start(), match.end()))
+
+    periods = []
+    i = 0
+    while i < len(matches):
+        start, end, label_start, label_end = matches[i]
+        # Both ends of a range are one period covering everything in between
+        if i + 1 < len(matches):
+            _, next_end, next_label_start, next_label_end = matches[i + 1]
+            connector = question[label_end:next_label_start]
+            is_range = RANGE_CONNECTOR_PATTERN.match(connector) or (
+                BETWEEN_CONNECTOR_PATTERN.match(connector) and BETWEEN_PATTERN.search(question[:label_start])
+            )
+            if is_range:
+                end, label_end = max(end, next_end), next_label_end
+                i += 1
+        i += 1
+
+        label = question[label_start:label_end].strip()
+        if label not in [period[0] for period in periods]:
+            periods.append((label, start, end))
+
+    if default_year is not None:
+        for match in BARE_MONTH_PATTERN.finditer(question):
+            month = MONTHS[match.group(1).lower()]
+            label = f"{match.group(1)} {default_year}"
+            if label not in [period[0] for period in periods]:
+                periods.append((label, *month_range(default_year, month, month)))
+
+    return periods
+
+def date_number(iso_date):
+    """
+    ISO date as a YYYYMMDD integer, comparable with $gte / $lte in Chroma filters.
+    """
+    return int(str(iso_date)[:10].replace("-", ""))
+
+def are_contiguous(periods):
+    """
+    Whether the periods follow each other (or overlap) without a gap, e.g. "2008" and "2009".
+    """
+    spans = sorted((start, end) for _, start, end in periods)
+    covered_until = spans[0][1]
+    for start, end in spans[1:]:
+        if covered_until != "9999-12-31" and start > (date.fromisoformat(covered_until) + timedelta(days=1)).isoformat():
+            return False
+        covered_until = max(covered_until, end)
+    return True
@@ -0,0 +1,187 @@
+from langchain_core.runnables import RunnableLambda
+from dataclasses import dataclass
+import math
+import re
+
+from .periods import extract_periods, are_contiguous
+from .dedup import source_dates
+
+# Words that mark a comparison between several periods or entities
+COMPARISON_PATTERN = re.compile(r"\s+(?:versus|vs\.?|compared (?:to|with))\s+", re.IGNORECASE)
+# Words joining two compared periods ("2012 and 2015", "2008 vs 2020"), dropped with the other period
+PERIOD_CONNECTOR = r"(?:,|and|or|versus|vs\.?|compared (?:to|with))"
+PREPOSITION = r"(?:(?:in|during|of|from|for)\s+)?"
+# Connectors left at the end of a sub-query or before its punctuation ("What happened in 2012 and ?")
+DANGLING_PATTERN = re.compile(r"(?:\s*\b(?:and|or|versus|vs\.?|compared|with|to|than)\b)+\s*(?=[?.!]|$)", re.IGNORECASE)
+LEADING_PATTERN = re.compile(r"^\s*(?:(?:and|or|versus|vs\.?)\b\s*)+", re.IGNORECASE)
+# Longest side of a comparison read as a compared item ("Powell", "the labor market")
+MAX_ITEM_WORDS = 3
+
+# Candidates fetched per sub-query for each fragment of its quota, so fragments
+# outside the sub-query period can be discarded without running short
+OVERFETCH = 3
+MAX_CONCURRENCY = 4
+
+
+@dataclass
+class SubQuery:
+    query: str
+    start_date: str = None
+    end_date: str = None
+
+    def in_period(self, doc):
+        if self.start_date is None:
+            return True
+        # A deduplicated fragment belongs to every meeting that repeated it
+        return any(self.start_date <= date <= self.end_date for date in source_dates(doc.metadata))
+
+
+def remove_period(question, label):
+    # Also drops the preposition in front of the period ("in 2020", "during 2008")
+    pattern = r"(?:\b(?:in|during|of|from|for|between)\s+)?" + re.escape(label)
+    return re.sub(pattern, "", question, flags=re.IGNORECASE)
+
+def remove_compared_period(question, label, labels):
+    """
+    Removes a period with the connector joining it to another period of the question:
+    "in 2012 and 2015" becomes "in 2012" or "in 2015", the preposition is shared by both.
+    """
+    others = "|".join(re.escape(other) for other in labels if other != label)
+    if others:
+        # The period comes first: drop it with the connector after it, keep the preposition
+        pattern = re.escape(label) + r"\s*" + PERIOD_CONNECTOR + r"\s+(?=" + PREPOSITION + r"(?:" + others + r"))"
+        query, found = re.subn(pattern, "", question, count=1, flags=re.IGNORECASE)
+        if found:
+            return query
+        # The period comes second: drop the connector, its own preposition and the period
+        pattern = r"(" + others + r")\s*" + PERIOD_CONNECTOR + r"\s+" + PREPOSITION + re.escape(label)
+        query, found = re.subn(pattern, r"\1", question, count=1, flags=re.IGNORECASE)
+        if found:
+            return query
+    return remove_period(question, label)
+
+def clean_query(query):
+    """
+    Drops the connectors and spaces a removed period or comparison side left behind.
+    """
+    query = LEADING_PATTERN.sub("", query)
+    query = DANGLING_PATTERN.sub("", query)
+    query = re.sub(r"\s+([?.!,])", r"\1", " ".join(query.split()))
+    return query.strip(" ,")
+
+def split_comparison(question, sides):
+    """
+    Sub-queries of a comparison between entities, each side completed with the shared predicate:
+    "Bernanke versus Powell on inflation" searches "Bernanke on inflation" and "Powell on inflation",
+    "What did Bernanke say about inflation vs Powell?" searches "What did Powell say about inflation?".
+    A side of at most MAX_ITEM_WORDS words is a compared item, it takes the place of the item at
+    the same end of the longest side (its first words, or the name/last words closing it).
+    """
+    sides = [side.strip() for side in sides if side.strip()]
+    words = [side.rstrip("?.!").split() for side in sides]
+    longest = max(range(len(sides)), key=lambda i: len(words[i]))
+    main_words = words[longest]
+    # Every sub-query ends like the question
+    punctuation = question[len(question.rstrip("?.! ")):].strip()
+
+    queries = []
+    for i, side in enumerate(sides):
+        item = words[i]
+        if i == longest or len(item) > MAX_ITEM_WORDS or len(item) >= len(main_words):
+            queries.append(" ".join(item) + punctuation)
+        elif i < longest:
+            # "Bernanke versus Powell on inflation": the longest side opens with its own item
+            queries.append(" ".join(item + main_words[len(item):]) + punctuation)
+        else:
+            # "What did Bernanke say about inflation vs Powell?": the item of the longest side is
+            # its last name (when comparing names) or its last words
+            names = [j for j, word in enumerate(main_words) if j and word[:1].isupper()] if item[0][:1].isupper() else []
+            if names:
+                end = names[-1] + 1
+                start = end
+                while start - 1 in names:
+                    start -= 1
+                completed = main_words[:start] + item + main_words[end:]
+            else:
+                completed = main_words[:-len(item)] + item
+            queries.append(" ".join(completed) + punctuation)
+    return [SubQuery(clean_query(query)) for query in queries]
+
+def plan_query(question):
+    """
+    Splits multi-period ("2008 vs 2020") and multi-entity ("Bernanke versus Powell") questions into sub-queries.
+    Each period sub-query keeps only its own period, so every period gets its own search.
+    Ranges ("from 2015 to 2018") are one period, and periods that follow each other are only
+    split when they are compared.
+    Returns:
+        sub_queries (list): SubQuery objects, a single one if the question does not need to be split.
+    """
+    periods = extract_periods(question)
+    if len(periods) > 1 and (COMPARISON_PATTERN.search(question) or not are_contiguous(periods)):
+        labels = [label for label, _, _ in periods]
+        sub_queries = []
+        for label, start_date, end_date in periods:
+            query = question
+            for other_label in labels:
+                if other_label != label:
+                    query = remove_compared_period(query, other_label, [l for l in labels if l in query])
+            sub_queries.append(SubQuery(clean_query(query), start_date, end_date))
+        return sub_queries
+
+    sides = COMPARISON_PATTERN.split(question)
+    if len(sides) > 1:
+        return split_comparison(question, sides)
+
+    return [SubQuery(question)]
+
+def doc_key(doc):
+    return doc.id or doc.page_content
+
+def merge_results(sub_queries, results, k):
+    """
+    Merges the sub-retrievals into one context of at most k fragments.
+    Each sub-query gets an equal quota, filled first with fragments of its own period,
+    and the fragments are interleaved so no period crowds out the others.
+    """
+    quota = math.ceil(k / len(sub_queries))
+    selected = []
+    for sub_query, docs in zip(sub_queries, results):
+        in_period = [doc for doc in docs if sub_query.in_period(doc)]
+        out_of_period = [doc for doc in docs if not sub_query.in_period(doc)]
+        selected.append((in_period + out_of_period)[:quota])
+
+    merged, seen = [], set()
+    for rank in range(quota):
+        for docs in selected:
+            if rank < len(docs) and doc_key(docs[rank]) not in seen:
+                seen.add(doc_key(docs[rank]))
+                merged.append(docs[rank])
+
+    return merged[:k]
+
+def with_planner(make_retriever, k, max_concurrency=MAX_CONCURRENCY):
+    """
+    Retrieval step with query decomposition: question -> documents.
+    Args:
+        make_retriever: Function returning a retriever for a given number of documents.
+        k (int): Fragment budget of the whole context.
+        max_concurrency (int): Sub-retrievals running at the same time.
+    """
+    retriever = make_retriever(k)
+
+    def retrieve(question):
+        sub_queries = plan_query(question)
+        if len(sub_queries) == 1:
+            return retriever.invoke(question)
+
+        print(f"Query split into {len(sub_queries)} sub-queries: {[sub_query.query for sub_query in sub_queries]}")
+        quota = math.ceil(k / len(sub_queries))
+        sub_retriever = make_retriever(quota * OVERFETCH)
+        # The sub-retrievals run concurrently
+        results = sub_retriever.batch(
+            [sub_query.query for sub_query in sub_queries],
+            config={"max_concurrency": max_concurrency}
+        )
+        return merge_results(sub_queries, results, k)
+
+    return RunnableLambda(retrieve)
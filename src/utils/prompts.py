@@ -1,19 +1,25 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+from functools import lru_cache
 
+from .format import RAGResponse
+
+@lru_cache(maxsize=None)
 def get_system_prompt():
     """
     Creates a prompt template for analyzing Federal Reserve press conference transcripts.
+    The template and its JSON schema instructions are built once per process.
     """
     system_prompt = """
         You are a Senior Monetary Policy Analyst specializing in the Federal Reserve (Fed). Your task is to analyze press conference transcripts to answer queries with extreme precision.
 
-        You will receive text chunks prefixed with a header like: **FRAGMENT [Date: YYYY-MM-DD | Page: X of Y]**.
+        You will receive text chunks prefixed with a header like: **FRAGMENT [Date: YYYY-MM-DD | Page: X of Y | Section: S]**.
 
         You must rigorously apply the following rules:
 
         ### 1. SPEAKER & CONTEXT INFERENCE
-        Since the text chunks may not explicitly name the speaker at every line, you must deduce it:
+        When the header has a **Section** (Opening statement, Reporter question or Chair answer), it identifies the speaker: trust it.
+        Otherwise the text chunks may not explicitly name the speaker at every line, and you must deduce it:
         - **Fed's Official Stance:** Long, expository blocks at the start (Page 1-5 usually) are likely the **Chair's Opening Statement** (Highest official weight).
         - **Q&A Session:** Short interactions or capitalized names (e.g., "MR. SMITH") followed by questions indicate the **Q&A Session**.
         - **Distinction:** Only the Chair's responses represent the official "Fed Sentiment."
@@ -34,10 +40,15 @@ def get_system_prompt():
         - You MUST provide a **separate sentiment classification** for each period.
         - Contrast the tone explicitly (e.g., "2008 was Neutral due to... whereas 2020 was Dovish because...").
 
+        ### 5. MEETING SUMMARIES
+        The context may start with lines like **MEETING SUMMARY [Date: YYYY-MM-DD]**: a precomputed sentiment, summary and key quotes of each press conference in the requested period.
+        - Use them to describe the overall tone and its evolution across meetings.
+        - Support the key assertions with the FRAGMENTS, citing their headers as usual.
+
         ### RESPONSE FORMAT. 
         **Answer:** Concise and factual.
-        **Sentiment Classification:** (Hawkish / Neutral / Dovish). 
-        **Key Evidence:** Direct quotes followed by their citation `[Date | Page]`.
+        **Sentiment:** (Hawkish / Neutral / Dovish). One classification per period for multi-period comparisons.
+        **Evidence:** Direct quotes followed by their citation `[Date | Page]`.
 
         **NEGATIVE CONSTRAINT:** If the retrieved chunks do not contain information for the requested specific period (e.g., user asks for 2025 but text is from 2021), state specifically: "The available context does not contain data for the requested period."
         """
@@ -68,7 +79,8 @@ def get_system_prompt():
         Do not add any markdown formatting (like ```json) or conversational text outside the JSON object.  
         """)
     ])
-    parser = JsonOutputParser()
+    # The typed schema gives the LLM the exact keys of the response
+    parser = JsonOutputParser(pydantic_object=RAGResponse)
     format_instructions = parser.get_format_instructions()
     prompt = template.partial(format_instructions=format_instructions)
 
@@ -208,4 +220,44 @@ def get_judge_3_prompt():
     format_instructions = parser.get_format_instructions()
     prompt = template.partial(format_instructions=format_instructions)
 
-    return prompt
\ No newline at end of file
+    return prompt
+
+def get_meeting_summary_prompt():
+    """
+    Creates a prompt template to summarize a whole press conference transcript (offline stage).
+    """
+    system_prompt = """
+        You are a Senior Monetary Policy Analyst specializing in the Federal Reserve (Fed).
+        You will receive the full transcript of ONE press conference held on {date}. The text is lemmatized and has no stop words.
+
+        ### TASK
+        - **Sentiment:** Classify the official Fed stance of the Chair (Hawkish / Neutral / Dovish).
+            - **Hawkish:** Emphasis on inflation control, price stability, tightening policies, or raising rates.
+            - **Dovish:** Emphasis on employment support, growth, easing policies, or lowering rates.
+            - **Neutral:** Data-dependent stance, balancing risks, or emphasizing uncertainty.
+        - **Summary:** 2-3 sentences with the policy decision and the main topics.
+        - **Key Quotes:** Up to 3 short quotes copied exactly from the transcript that justify the sentiment.
+
+        Use ONLY the provided transcript.
+        """
+
+    template = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", """
+        --- TRANSCRIPT START ---
+        {transcript}
+        --- TRANSCRIPT END ---
+
+        ### OUTPUT FORMAT
+        Return a valid JSON object with the following structure:
+        {{
+        "Sentiment": "Hawkish" | "Neutral" | "Dovish",
+        "Summary": string,
+        "Key Quotes": [string]
+        }}
+
+        Do not add any markdown formatting (like ```json) or conversational text outside the JSON object.
+        """)
+    ])
+
+    return template
@@ -0,0 +1,145 @@
+import numpy as np
+import faiss
+import os
+
+from .local_index import LocalIndex, VECTORS_FILE, top_k, save_params
+
+QUANTIZATION_TYPES = ["int8", "float16"]
+# faiss scalar quantizers: 8 bits per dimension (range trained per dimension) or half floats.
+# The int8 codes use one range per dimension trained on the corpus, not one scale per vector:
+# faiss scans them with SIMD kernels, while the per-vector scheme (PerVectorInt8Index, kept as
+# the reference of data/quantize_collection.py) needs a numpy scan that is slower than the exact search.
+SCALAR_QUANTIZERS = {
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+}
+
+# Rows added to the index at the same time, the float32 vectors are never loaded at once
+BLOCK_SIZE = 8192
+# Vectors used to train the per-dimension ranges of the int8 quantizer
+TRAINING_SIZE = 100_000
+
+
+def quantized_file(dtype):
+    return f"sq_{dtype}.faiss"
+
+def build_quantized_index(index_dir, dtype="int8"):
+    """
+    Quantizes the float32 vectors of an exported collection into a faiss scalar quantizer
+    index (inner product) stored next to them.
+    Args:
+        index_dir (str): Directory created by `export_collection`.
+        dtype (str): "int8" or "float16".
+    """
+    if dtype not in QUANTIZATION_TYPES:
+        raise ValueError(f"Unknown quantization type: {dtype}. Use one of {QUANTIZATION_TYPES}")
+
+    vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r")
+    index = faiss.IndexScalarQuantizer(vectors.shape[1], SCALAR_QUANTIZERS[dtype], faiss.METRIC_INNER_PRODUCT)
+
+    sample = np.linspace(0, len(vectors) - 1, min(len(vectors), TRAINING_SIZE)).astype(np.int64)
+    index.train(np.ascontiguousarray(vectors[sample], dtype=np.float32))
+    for start in range(0, len(vectors), BLOCK_SIZE):
+        index.add(np.ascontiguousarray(vectors[start : start + BLOCK_SIZE], dtype=np.float32))
+
+    faiss.write_index(index, os.path.join(index_dir, quantized_file(dtype)))
+    save_params(index_dir, {f"quantized_{dtype}": True})
+
+    print(f"{dtype} codes saved in '{index_dir}'")
+
+
+class QuantizedIndex(LocalIndex):
+    """
+    Two-stage search over quantized vectors:
+    1. Approximate pass of faiss over the int8 / float16 codes (kept in memory), the codes
+       are decoded on the fly by its SIMD kernels, without float32 copies of the vectors.
+    2. The best `k * rescore_factor` candidates are rescored with the float32 vectors,
+       which stay memory-mapped on disk and are only read for those candidates.
+    """
+    def __init__(self, index_dir, dtype="int8", rescore_factor=4):
+        super().__init__(index_dir)
+        if dtype not in QUANTIZATION_TYPES:
+            raise ValueError(f"Unknown quantization type: {dtype}. Use one of {QUANTIZATION_TYPES}")
+
+        self.dtype = dtype
+        self.rescore_factor = rescore_factor
+        path = os.path.join(index_dir, quantized_file(dtype))
+        # Indexes quantized before the faiss codes are converted once
+        if not os.path.exists(path):
+            build_quantized_index(index_dir, dtype)
+        self.index = faiss.read_index(path)
+
+    def approximate_search(self, query_vector, k):
+        query = np.ascontiguousarray(query_vector, dtype=np.float32).reshape(1, -1)
+        scores, positions = self.index.search(query, min(k, self.index.ntotal))
+        # faiss pads with -1 when less than k vectors are found
+        found = positions[0] >= 0
+        return positions[0][found], scores[0][found]
+
+    def search(self, query_vector, k, rescore=True):
+        if not rescore:
+            return self.approximate_search(query_vector, k)
+
+        # Rescore the candidates with full precision
+        candidates, _ = self.approximate_search(query_vector, k * self.rescore_factor)
+        exact = self.get_vectors(candidates) @ query_vector
+        best = top_k(exact, k)
+        return candidates[best], exact[best]
+
+    def memory_bytes(self):
+        # Codes scanned by the approximate pass
+        return self.index.sa_code_size() * self.index.ntotal
+
+
+def quantize_per_vector(vectors):
+    """
+    Symmetric int8 quantization with one scale per vector: codes = round(v / scale),
+    scale = max(|v|) / 127, so every row uses the full int8 range.
+    Returns:
+        codes (np.ndarray): (n, dim) int8 codes.
+        scales (np.ndarray): (n,) float32 scales.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class PerVectorInt8Index(LocalIndex):
+    """
+    int8 codes with one float32 scale per vector, the scale being applied at scoring time:
+    score = scale * (query . codes). Reference of the faiss per-dimension int8 quantizer in
+    the quantization benchmark, the codes are built in memory and not saved.
+    """
+    def __init__(self, index_dir, rescore_factor=4):
+        super().__init__(index_dir)
+        self.rescore_factor = rescore_factor
+        codes, scales = [], []
+        for start in range(0, len(self.vectors), BLOCK_SIZE):
+            block_codes, block_scales = quantize_per_vector(self.vectors[start : start + BLOCK_SIZE])
+            codes.append(block_codes)
+            scales.append(block_scales)
+        self.codes = np.concatenate(codes)
+        self.scales = np.concatenate(scales)
+
+    def approximate_search(self, query_vector, k):
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), BLOCK_SIZE):
+            block = self.codes[start : start + BLOCK_SIZE]
+            scores[start : start + len(block)] = (block.astype(np.float32) @ query) * self.scales[start : start + len(block)]
+        best = top_k(scores, k)
+        return best, scores[best]
+
+    def search(self, query_vector, k, rescore=True):
+        if not rescore:
+            return self.approximate_search(query_vector, k)
+
+        candidates, _ = self.approximate_search(query_vector, k * self.rescore_factor)
+        exact = self.get_vectors(candidates) @ query_vector
+        best = top_k(exact, k)
+        return candidates[best], exact[best]
+
+    def memory_bytes(self):
+        return self.codes.nbytes + self.scales.nbytes
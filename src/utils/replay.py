@@ -0,0 +1,169 @@
+from langchain_core.runnables import RunnableLambda
+from langchain_core.documents import Document
+from collections import Counter
+import threading
+import hashlib
+import sqlite3
+import json
+import zlib
+import os
+
+# Recordings of the experiment runs (see src/run_experiments.py)
+REPLAY_DB = os.path.join("data", "replay", "experiments.sqlite3")
+
+# "replay": use the recording when the inputs are unchanged, call live (and record) otherwise
+# "offline": never call live, a missing recording is an error
+# "refresh": always call live and overwrite the recordings
+REPLAY_MODE = os.getenv("REPLAY_MODE", "replay")
+REPLAY_MODES = ["replay", "offline", "refresh"]
+
+
+def recording_key(kind, inputs):
+    """
+    Hash of the canonical JSON of the inputs, any change in them gives a new key.
+    """
+    payload = json.dumps([kind, inputs], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def pack(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+def unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class ReplayStore:
+    """
+    Local store of recorded calls: retrieval results, rendered prompts and raw LLM outputs.
+    Each recording is keyed by a hash of its inputs, so replay only falls through to a
+    live call when an input changed (a new prompt, another k, an edited question...).
+    """
+    def __init__(self, db_path=REPLAY_DB, mode=REPLAY_MODE):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Unknown replay mode: {mode}. Use one of {REPLAY_MODES}")
+        self.mode = mode
+        # Run that new recordings belong to, for traceability
+        self.run_name = None
+        # Replayed and live calls per kind ("llm", "retrieval")
+        self.hits = Counter()
+        self.misses = Counter()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS recordings (
+                key TEXT PRIMARY KEY,
+                kind TEXT,
+                run_name TEXT,
+                inputs BLOB,
+                output BLOB,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, kind, inputs):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT output FROM recordings WHERE key = ?", (recording_key(kind, inputs),)
+            ).fetchone()
+        return None if row is None else unpack(row[0])
+
+    def put(self, kind, inputs, output):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO recordings (key, kind, run_name, inputs, output) VALUES (?, ?, ?, ?, ?)",
+                (recording_key(kind, inputs), kind, self.run_name, pack(inputs), pack(output))
+            )
+            self.conn.commit()
+
+    def call(self, kind, inputs, live):
+        """
+        Returns the recorded output for the inputs, or runs `live()` and records its
+        (JSON serializable) output.
+        """
+        if self.mode != "refresh":
+            output = self.get(kind, inputs)
+            if output is not None:
+                self.hits[kind] += 1
+                return output
+            if self.mode == "offline":
+                raise LookupError(f"No recording for this {kind} call and REPLAY_MODE is offline")
+
+        self.misses[kind] += 1
+        output = live()
+        self.put(kind, inputs, output)
+        return output
+
+    def close(self):
+        self.conn.close()
+
+
+class RecordedChatModel:
+    """
+    Chat model wrapper that records the rendered prompt and the raw output of every call.
+    The model is only loaded on the first call that can not be replayed.
+    Args:
+        store (ReplayStore): Recordings store.
+        settings (dict): Settings the model is loaded with (model, temperature...), part of the
+            recording key, so changing them records new outputs instead of replaying stale ones.
+        load_model (callable): Returns the live LangChain model.
+    """
+    def __init__(self, store, settings, load_model):
+        self.store = store
+        self.settings = settings
+        self.load_model = load_model
+        self.model = None
+        self.live_calls = 0
+
+    def get_model(self):
+        if self.model is None:
+            self.model = self.load_model()
+        return self.model
+
+    def generate(self, prompt_value, **kwargs):
+        messages = [{"role": message.type, "content": message.content} for message in prompt_value.to_messages()]
+        inputs = {"model": self.settings, "messages": messages, **kwargs}
+
+        def live():
+            self.live_calls += 1
+            output = self.get_model().bind(**kwargs).invoke(prompt_value)
+            # Chat models return a message, local pipelines return the text
+            return getattr(output, "content", output)
+
+        return self.store.call("llm", inputs, live)
+
+    def bind(self, **kwargs):
+        return RunnableLambda(lambda prompt_value: self.generate(prompt_value, **kwargs))
+
+
+def collection_fingerprint(collection):
+    """
+    Identifies the indexed data of a Chroma collection. A re-index builds a new collection
+    (new id), so recordings of the previous data are not replayed.
+    """
+    return {"collection_id": str(collection.id), "count": collection.count()}
+
+def recorded_retriever(store, search, make_retriever):
+    """
+    Retriever runnable that records the retrieved documents of each query.
+    Args:
+        store (ReplayStore): Recordings store.
+        search (dict): Collection, its fingerprint (see `collection_fingerprint`) and search
+            parameters, part of the recording key.
+        make_retriever (callable): Returns the live retriever, only called on a miss.
+    """
+    retriever = []
+
+    def retrieve(query):
+        def live():
+            if not retriever:
+                retriever.append(make_retriever())
+            docs = retriever[0].invoke(query)
+            return [{"page_content": doc.page_content, "metadata": doc.metadata, "id": doc.id} for doc in docs]
+
+        records = store.call("retrieval", {**search, "query": query}, live)
+        return [Document(**record) for record in records]
+
+    return RunnableLambda(retrieve)
@@ -0,0 +1,101 @@
+from langchain_core.runnables import RunnableLambda
+from collections import OrderedDict
+import threading
+
+
+class Reranker:
+    """
+    Cross-encoder rerank stage between the retriever and `format_docs`.
+    - Candidates are scored in batches, in the order given by the retriever.
+    - Scoring stops early once `top_n` candidates reach `score_threshold`.
+    - Scores are cached per (query, chunk) in a bounded LRU cache.
+    """
+    def __init__(self, model, top_n=10, score_threshold=0.0, min_docs=3, batch_size=16, cache_size=10000):
+        """
+        Args:
+            model: sentence_transformers CrossEncoder (see utils.llms.load_reranker_model).
+            top_n (int): Maximum number of fragments sent to the prompt.
+            score_threshold (float): Minimum cross-encoder score (logit) to keep a fragment.
+            min_docs (int): Fragments kept even if they are below the threshold.
+            batch_size (int): Pairs scored per forward pass.
+            cache_size (int): Maximum number of cached (query, chunk) scores.
+        """
+        self.model = model
+        self.top_n = top_n
+        self.score_threshold = score_threshold
+        self.min_docs = min_docs
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(query, doc):
+        return (query, doc.id or doc.page_content)
+
+    def get_cached(self, key):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        return None
+
+    def set_cached(self, key, score):
+        with self.lock:
+            self.cache[key] = score
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def score(self, query, docs, top_n=None):
+        """
+        Scores the candidates batch by batch, stopping early when enough of them pass the threshold.
+        Returns:
+            scored (list): (score, doc) tuples of the candidates that were scored.
+        """
+        scored = []
+        passed = 0
+        for start in range(0, len(docs), self.batch_size):
+            batch = docs[start : start + self.batch_size]
+            keys = [self.cache_key(query, doc) for doc in batch]
+            scores = [self.get_cached(key) for key in keys]
+
+            # Only the pairs that are not cached go through the model
+            missing = [i for i, score in enumerate(scores) if score is None]
+            if missing:
+                new_scores = self.model.predict(
+                    [(query, batch[i].page_content) for i in missing],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+                for i, score in zip(missing, new_scores):
+                    scores[i] = float(score)
+                    self.set_cached(keys[i], scores[i])
+
+            scored.extend(zip(scores, batch))
+            passed += sum(score >= self.score_threshold for score in scores)
+            if passed >= (top_n or self.top_n):
+                break
+
+        return scored
+
+    def rerank(self, query, docs, top_n=None):
+        """
+        Returns the best `top_n` candidates sorted by cross-encoder score.
+        """
+        top_n = top_n or self.top_n
+        scored = sorted(self.score(query, docs, top_n), key=lambda pair: pair[0], reverse=True)
+        selected = [doc for score, doc in scored if score >= self.score_threshold][:top_n]
+
+        # Never leave the prompt without context
+        if len(selected) < self.min_docs:
+            selected = [doc for _, doc in scored[: self.min_docs]]
+
+        return selected
+
+
+def with_reranker(retriever, reranker, top_n=None):
+    """
+    Chains a retriever with the rerank stage: question -> reranked documents.
+    """
+    return RunnableLambda(lambda question: reranker.rerank(question, retriever.invoke(question), top_n))
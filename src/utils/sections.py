@@ -0,0 +1,61 @@
+import re
+
+# Sections of a press conference transcript, stored in the "section" metadata of the chunks
+OPENING_STATEMENT = "opening_statement"
+QUESTION = "question"
+CHAIR_ANSWER = "chair_answer"
+SECTION_LABELS = {
+    OPENING_STATEMENT: "Opening statement",
+    QUESTION: "Reporter question",
+    CHAIR_ANSWER: "Chair answer",
+}
+# Text that carries the official Fed view
+CHAIR_SECTIONS = [OPENING_STATEMENT, CHAIR_ANSWER]
+
+# Speaker markers at the start of a line: a role or honorific and a name ("CHAIR POWELL.",
+# "CHAIRMAN BERNANKE.", "VICE CHAIR JEFFERSON.", "MR. SMITH."), or "MODERATOR.".
+# Other all-caps lines ("THE UNITED STATES ECONOMY.") are not speakers.
+SPEAKER_PATTERN = re.compile(
+    r"^[ \t]*((?:(?:VICE[ \t]+)?CHAIR(?:MAN|WOMAN)?|GOVERNOR|PRESIDENT|MR|MS|MRS|MISS|DR)\.?"
+    r"(?:[ \t]+[A-Z][A-Z'\-]+){1,2}|MODERATOR)\.[ \t]+",
+    re.MULTILINE
+)
+# Fed officials on the podium, their turns carry the official view
+CHAIR_SPEAKER_PATTERN = re.compile(r"^(?:VICE )?CHAIR(?:MAN|WOMAN)?\b")
+
+# Questions about the official view of the Fed, answered from the Chair's words only
+OFFICIAL_PATTERN = re.compile(
+    r"\b(official|sentiment|stance|chair(?:man|woman)?|powell|yellen|bernanke|"
+    r"fed'?s (?:view|position|outlook|assessment)|committee'?s (?:view|position|outlook|assessment))\b",
+    re.IGNORECASE
+)
+# Questions about the Q&A itself need the reporters' questions
+QUESTION_PATTERN = re.compile(r"\b(reporters?|journalists?|questions? (?:asked|from))\b", re.IGNORECASE)
+
+
+def is_chair_speaker(speaker):
+    return CHAIR_SPEAKER_PATTERN.match(speaker) is not None
+
+def split_speakers(text):
+    """
+    Splits a text at the speaker markers.
+    Returns:
+        turns (list): (speaker, text) tuples, the speaker is None for the text before the first marker.
+    """
+    turns = []
+    matches = list(SPEAKER_PATTERN.finditer(text))
+    start = matches[0].start() if matches else len(text)
+    if text[:start].strip():
+        turns.append((None, text[:start].strip()))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        turns.append((" ".join(match.group(1).split()), text[match.end() : end].strip()))
+    return turns
+
+def chair_sections_filter(question):
+    """
+    Sections the retrieval can be restricted to for a question, None to search every section.
+    """
+    if OFFICIAL_PATTERN.search(question) and not QUESTION_PATTERN.search(question):
+        return CHAIR_SECTIONS
+    return None
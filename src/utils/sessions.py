@@ -0,0 +1,247 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import threading
+import time
+import re
+import os
+
+from .periods import extract_periods, are_contiguous, BARE_MONTH_PATTERN
+from .planner import SubQuery, remove_compared_period, clean_query, doc_key, COMPARISON_PATTERN
+from .format import format_docs
+
+# Conversations kept in memory, the least recently active one is dropped first
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", 500))
+# Sessions idle for longer are evicted
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", 1800))
+# Fragments (with their formatted text) cached per session
+SESSION_MAX_FRAGMENTS = 100
+
+# Questions that only make sense after the previous one: "and what about June?", "why?"
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*(?:and|but|also|what about|how about|what of|same (?:for|in|with)|"
+    r"why\b|how so\b|tell me more|more (?:on|about) (?:that|this|it))\b",
+    re.IGNORECASE
+)
+# Follow-ups that only ask to expand the previous answer, answered from the same fragments
+ELABORATION_PATTERN = re.compile(
+    r"^\s*(?:and\s+|but\s+)?(?:why|how so|how come|tell me more(?: about (?:that|this|it))?|"
+    r"more (?:on|about) (?:that|this|it)|(?:can you\s+)?(?:elaborate|explain)(?: on)?(?: (?:that|this|it))?)"
+    r"(?:,?\s*please)?\s*[?.!]*\s*$",
+    re.IGNORECASE
+)
+# Connector in front of a follow-up on another subject, dropped from its search
+CONNECTOR_PATTERN = re.compile(r"^\s*(?:and|but|also)\b[\s,]*", re.IGNORECASE)
+# Words of a follow-up that only point back to the conversation, its subject is what remains
+REFERENCE_PATTERN = re.compile(
+    r"^\s*(?:(?:and|but|also|so)\b[\s,]*)*(?:(?:what|how) about\b|what of\b|same (?:for|in|with)\b)?\s*",
+    re.IGNORECASE
+)
+
+
+@dataclass
+class FollowUp(SubQuery):
+    """
+    Follow-up question resolved against the conversation: `query` is the stand-alone question sent
+    to the LLM and the dates are the period its fragments must come from.
+    """
+    # Text embedded for a follow-up on another subject, None to reuse the query vector of the topic
+    search: str = None
+    # Only expands the previous answer, which is answered from the same fragments
+    elaboration: bool = False
+    # Question the next follow-ups refer to
+    question: str = None
+    # One SubQuery per compared period ("inflation in 2023 versus 2019?"), None for a single period
+    sub_queries: list = None
+
+
+@dataclass
+class SessionState:
+    """
+    Retrieval state of a conversation: the fragments retrieved so far (with their formatted
+    text), the fragments of the last context and the query vector of the topic.
+    """
+    question: str
+    collection_name: str
+    periods: list
+    # Question without its periods, embedded once for every follow-up on another period
+    topic: str
+    query_vector: object = None
+    fragments: OrderedDict = field(default_factory=OrderedDict)
+    # Fragments retrieved for the current topic, the only ones reused by the follow-ups on another period
+    topic_keys: set = field(default_factory=set)
+    last_docs: list = field(default_factory=list)
+    last_access: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def start(cls, question, collection_name):
+        periods = extract_periods(question)
+        return cls(question, collection_name, periods, remove_periods(question, periods))
+
+    def ask(self, follow_up):
+        """
+        Follow-ups about another period or subject become the question the next ones refer to.
+        The periods of the conversation are kept when the follow-up does not name any.
+        """
+        self.question = follow_up.question
+        self.periods = extract_periods(follow_up.question) or self.periods
+        if follow_up.search and follow_up.search != self.topic:
+            self.topic = follow_up.search
+            self.query_vector = None
+            self.topic_keys = set()
+
+    @property
+    def year(self):
+        # Year the months named without one refer to
+        if not self.periods:
+            return None
+        return int(self.periods[-1][2][:4])
+
+    @property
+    def docs(self):
+        return [doc for key, (doc, _) in self.fragments.items() if key in self.topic_keys]
+
+    def add(self, docs):
+        """
+        Caches new fragments with their formatted text, each fragment is formatted once.
+        """
+        for doc in docs:
+            key = doc_key(doc)
+            if key in self.fragments:
+                self.fragments.move_to_end(key)
+            else:
+                self.fragments[key] = (doc, format_docs([doc]))
+            self.topic_keys.add(key)
+        while len(self.fragments) > SESSION_MAX_FRAGMENTS:
+            key, _ = self.fragments.popitem(last=False)
+            self.topic_keys.discard(key)
+
+    def build_context(self, docs):
+        """
+        Context of the given fragments from their cached formatted text.
+        """
+        self.last_docs = docs
+        texts = []
+        for doc in docs:
+            cached = self.fragments.get(doc_key(doc))
+            texts.append(cached[1] if cached else format_docs([doc]))
+        return "\n\n".join(texts)
+
+
+def is_follow_up(question):
+    return FOLLOW_UP_PATTERN.match(question) is not None
+
+def remove_periods(question, periods):
+    # Periods and the connectors joining them: "Compare 2008 versus 2020 unemployment tone" -> "Compare unemployment tone"
+    labels = [label for label, _, _ in periods]
+    for label in labels:
+        question = remove_compared_period(question, label, [other for other in labels if other in question])
+    return clean_query(question)
+
+def follow_up_subject(question, periods):
+    """
+    What a follow-up asks about once its periods and the words pointing back to the
+    conversation are removed: "and what about inflation in June 2024?" -> "inflation".
+    Returns:
+        subject (str): None if the follow-up only changes the period ("and in 2024?").
+    """
+    subject = REFERENCE_PATTERN.sub("", remove_periods(question, periods))
+    subject = subject.strip(" ,?.!")
+    return subject if re.search(r"\w", subject) else None
+
+def plan_follow_up(state, question):
+    """
+    Resolves a follow-up question against the previous question of the conversation.
+    Months without a year take the year of the previous question ("and June?").
+    A follow-up without a period either expands the previous answer ("why?") or asks about
+    another subject ("and what about the labor market?") in the period of the conversation.
+    A follow-up with a period asks the previous question about it ("and in 2024?"), or about
+    its own subject ("and what about inflation in June?"). Compared periods ("also inflation
+    in 2023 versus 2019?") get one sub-query each, like in the planner.
+    Returns:
+        follow_up (FollowUp): Stand-alone question, period and kind of the follow-up,
+            None if the question is not a follow-up.
+    """
+    if not is_follow_up(question):
+        return None
+
+    if state.year is not None:
+        question = BARE_MONTH_PATTERN.sub(lambda match: f"{match.group(1)} {state.year}", question)
+    periods = extract_periods(question)
+    subject = follow_up_subject(question, periods)
+    # The follow-up in its own words, without the connector
+    own_question = CONNECTOR_PATTERN.sub("", question) or question
+
+    if not periods:
+        standalone = f"{state.question} Follow-up: {question}"
+        if ELABORATION_PATTERN.match(question) or subject is None:
+            return FollowUp(standalone, elaboration=True)
+        if not state.periods:
+            return FollowUp(standalone, search=subject, question=own_question)
+        # Periods compared so far stay separate searches
+        split = len(state.periods) > 1 and not are_contiguous(state.periods)
+        sub_queries = [SubQuery(f"{subject} in {label}?", start, end) for label, start, end in state.periods] if split else None
+        return FollowUp(standalone, min(p[1] for p in state.periods), max(p[2] for p in state.periods),
+                        search=subject, question=own_question, sub_queries=sub_queries)
+
+    labels = [label for label, _, _ in periods]
+    compared = COMPARISON_PATTERN.search(question) is not None
+    split = len(periods) > 1 and (compared or not are_contiguous(periods))
+    joined = (" versus " if compared else " and ").join(labels)
+    if subject is not None:
+        # Another subject in another period
+        standalone = f"{state.question} Follow-up: {own_question}"
+        next_question = own_question
+    elif len(state.periods) == 1 and not split and re.search(re.escape(state.periods[0][0]), state.question, re.IGNORECASE):
+        # Same question about another period
+        standalone = re.sub(re.escape(state.periods[0][0]), joined, state.question, count=1, flags=re.IGNORECASE)
+        next_question = standalone
+    else:
+        standalone = f"{state.topic.rstrip(' ?.')} in {joined}?"
+        next_question = standalone
+
+    topic = subject or state.topic.rstrip(" ?.")
+    sub_queries = [SubQuery(f"{topic} in {label}?", start, end) for label, start, end in periods] if split else None
+    return FollowUp(standalone, min(p[1] for p in periods), max(p[2] for p in periods),
+                    search=subject, question=next_question, sub_queries=sub_queries)
+
+
+class SessionStore:
+    """
+    Bounded per-session cache of SessionState, in order of last access.
+    Sessions idle for more than `idle_timeout` seconds are evicted on the next access.
+    """
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_timeout=SESSION_IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def evict_idle(self):
+        # The least recently used sessions come first, stop at the first active one
+        deadline = time.monotonic() - self.idle_timeout
+        while self.sessions and next(iter(self.sessions.values())).last_access < deadline:
+            self.sessions.popitem(last=False)
+
+    def get(self, session_id):
+        with self.lock:
+            self.evict_idle()
+            state = self.sessions.get(session_id)
+            if state is not None:
+                state.last_access = time.monotonic()
+                self.sessions.move_to_end(session_id)
+            return state
+
+    def put(self, session_id, state):
+        with self.lock:
+            state.last_access = time.monotonic()
+            self.sessions[session_id] = state
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def pop(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None)
@@ -0,0 +1,170 @@
+import numpy as np
+import json
+import os
+
+from .sections import SECTION_LABELS
+from .dedup import source_dates
+
+# Files of the text store of an exported collection
+TEXTS_FILE = "texts.bin"
+FRAGMENTS_FILE = "fragments.npy"
+
+# Other meetings listed in the header of a deduplicated fragment
+MAX_HEADER_SOURCES = 5
+
+# One row per chunk: id, byte offsets in TEXTS_FILE and the fields of the fragment header.
+# The "sources" JSON of a deduplicated chunk follows its text, up to `sources_end`.
+FRAGMENT_DTYPE = np.dtype([
+    ("id", "U64"),
+    ("start", "i8"),
+    ("end", "i8"),
+    ("sources_end", "i8"),
+    ("creationdate", "U32"),
+    ("page", "i4"),
+    ("total_pages", "i4"),
+    ("section", "U20"),
+])
+
+
+def build_text_store(index_dir, ids, texts, metadatas):
+    """
+    Writes the chunk texts of a collection as one UTF-8 file plus a table of offsets and header fields.
+    Newlines are replaced by spaces here, once at index time, instead of on every query.
+    """
+    fragments = np.zeros(len(ids), dtype=FRAGMENT_DTYPE)
+    offset = 0
+    with open(os.path.join(index_dir, TEXTS_FILE), "wb") as f:
+        for i, (chunk_id, text, meta) in enumerate(zip(ids, texts, metadatas)):
+            data = (text or "").replace("\n", " ").encode("utf-8")
+            meta = meta or {}
+            # Only the chunks repeated in several meetings need their sources
+            sources = (meta.get('sources') or "").encode("utf-8") if meta.get('duplicates', 1) > 1 else b""
+            f.write(data + sources)
+            fragments[i] = (
+                chunk_id,
+                offset,
+                offset + len(data),
+                offset + len(data) + len(sources),
+                str(meta.get('creationdate', 'Unknown Date')),
+                int(meta.get('page', -1)),
+                int(meta.get('total_pages', -1)),
+                meta.get('section', ''),
+            )
+            offset += len(data) + len(sources)
+
+    np.save(os.path.join(index_dir, FRAGMENTS_FILE), fragments)
+
+
+def format_header(meta):
+    """
+    Header of a fragment in the prompt context, with its section when the transcript was segmented
+    and the other meetings that repeated it when it was deduplicated.
+    """
+    header = f"FRAGMENT [Date: {meta.get('creationdate', 'Unknown Date')} | Page: {meta.get('page', '?')} of {meta.get('total_pages', '?')}"
+    if meta.get('section') in SECTION_LABELS:
+        header += f" | Section: {SECTION_LABELS[meta['section']]}"
+    if meta.get('sources'):
+        date = str(meta.get('creationdate', ''))[:10]
+        others = sorted({d for d in source_dates(meta) if d != date}, reverse=True)
+        if others:
+            more = f" and {len(others) - MAX_HEADER_SOURCES} more" if len(others) > MAX_HEADER_SOURCES else ""
+            header += f" | Also in: {', '.join(others[:MAX_HEADER_SOURCES])}{more}"
+    return header + "] "
+
+
+class TextStore:
+    """
+    Memory-mapped chunk texts. Nothing is decoded until a fragment is materialized.
+    """
+    def __init__(self, index_dir):
+        self.fragments = np.load(os.path.join(index_dir, FRAGMENTS_FILE), mmap_mode="r")
+        path = os.path.join(index_dir, TEXTS_FILE)
+        # np.memmap can not map empty files
+        self.texts = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.empty(0, dtype=np.uint8)
+        # Stores built before the speaker segmentation have no section column
+        self.has_sections = "section" in self.fragments.dtype.names and bool(np.any(self.fragments["section"] != ""))
+        # Stores built before the dedup sources were kept have no sources column
+        self.has_sources = "sources_end" in self.fragments.dtype.names
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def filter_positions(self, sections):
+        """
+        Positions of the fragments of the given sections.
+        """
+        return np.flatnonzero(np.isin(self.fragments["section"], sections))
+
+    def date_positions(self, start_date, end_date):
+        """
+        Positions of the fragments created between two ISO dates (inclusive).
+        A deduplicated fragment matches if any of the meetings that repeated it does.
+        """
+        dates = self.fragments["creationdate"].astype("U10")
+        matches = (dates >= start_date) & (dates <= end_date)
+        if self.has_sources:
+            # Only the few deduplicated fragments outside the period need their sources decoded
+            for position in np.flatnonzero(~matches & (self.fragments["sources_end"] > self.fragments["end"])):
+                matches[position] = any(start_date <= d <= end_date for d in source_dates(self.get_metadata(position)))
+        return np.flatnonzero(matches)
+
+    def get_text(self, position):
+        row = self.fragments[position]
+        return self.texts[row["start"] : row["end"]].tobytes().decode("utf-8")
+
+    def get_metadata(self, position):
+        row = self.fragments[position]
+        metadata = {'creationdate': str(row["creationdate"])}
+        # -1 marks a missing page number
+        if row["page"] >= 0:
+            metadata['page'] = int(row["page"])
+        if row["total_pages"] >= 0:
+            metadata['total_pages'] = int(row["total_pages"])
+        if self.has_sections and row["section"]:
+            metadata['section'] = str(row["section"])
+        if self.has_sources and row["sources_end"] > row["end"]:
+            metadata['sources'] = self.texts[row["end"] : row["sources_end"]].tobytes().decode("utf-8")
+        return metadata
+
+    def get_header(self, position):
+        return format_header(self.get_metadata(position))
+
+
+class Fragment:
+    """
+    Lightweight retrieval result: a position in the text store and its score.
+    The text, metadata and header are only materialized when they are accessed,
+    so the candidates discarded by MMR or the planner are never decoded.
+    It exposes the attributes of a LangChain Document used by the pipeline.
+    """
+    __slots__ = ("store", "position", "score", "_page_content", "_metadata")
+
+    def __init__(self, store, position, score=None):
+        self.store = store
+        self.position = int(position)
+        self.score = score
+        self._page_content = None
+        self._metadata = None
+
+    @property
+    def id(self):
+        return str(self.store.fragments[self.position]["id"])
+
+    @property
+    def page_content(self):
+        if self._page_content is None:
+            self._page_content = self.store.get_text(self.position)
+        return self._page_content
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._metadata = self.store.get_metadata(self.position)
+        return self._metadata
+
+    def format(self):
+        # The text was normalized at index time
+        return f"{self.store.get_header(self.position)}\n{self.page_content}"
+
+    def __repr__(self):
+        return f"Fragment(position={self.position}, score={self.score})"
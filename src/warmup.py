@@ -0,0 +1,79 @@
+from huggingface_hub import snapshot_download
+import compileall
+import time
+import os
+
+from utils.encoders import export_onnx_encoder, save_optimized_model, ONNXEmbeddings, EMBEDDING_MODEL_NAME, ONNX_ENCODER_DIR
+from utils.local_index import LocalIndex, VECTORS_FILE
+from utils.text_store import TEXTS_FILE
+
+# Local exports of the collections (see data/quantize_collection.py)
+INDEX_DIR = os.path.join("data", "indexes")
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# Read size when loading the index files into the OS page cache
+READ_BLOCK_BYTES = 16 * 2**20
+
+
+def prefetch_file(path):
+    """
+    Reads a file once so the memory-mapped pages are in the OS page cache of the next process.
+    """
+    with open(path, "rb") as f:
+        while f.read(READ_BLOCK_BYTES):
+            pass
+
+def warm_encoder():
+    # Export and quantize the encoder only once
+    if not os.path.exists(ONNX_ENCODER_DIR):
+        export_onnx_encoder()
+
+    for quantized in [False, True]:
+        path = save_optimized_model(quantized=quantized)
+        print(f"Optimized graph saved to '{path}'")
+
+    start = time.perf_counter()
+    encoder = ONNXEmbeddings(quantized=True)
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    encoder.embed_query("What did the Chair say about inflation?")
+    print(f"onnx-int8 encoder loaded in {load_seconds:.2f} s, first query in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+def warm_indexes():
+    if not os.path.exists(INDEX_DIR):
+        print(f"No local indexes in '{INDEX_DIR}'")
+        return
+
+    for name in sorted(os.listdir(INDEX_DIR)):
+        index_dir = os.path.join(INDEX_DIR, name)
+        if not os.path.exists(os.path.join(index_dir, VECTORS_FILE)):
+            continue
+        # Builds the text store of the indexes exported before it existed
+        LocalIndex(index_dir)
+        for file_name in [VECTORS_FILE, TEXTS_FILE]:
+            prefetch_file(os.path.join(index_dir, file_name))
+        print(f"Index '{name}' loaded into the page cache")
+
+def main():
+    """
+    Primes the caches used at start up, so a fresh UI or worker process is ready in a few seconds:
+    model weights, ONNX encoder with its optimized graph, text stores, page cache and bytecode.
+    """
+    print('-'*50)
+    for model_name in [EMBEDDING_MODEL_NAME, RERANKER_MODEL_NAME]:
+        snapshot_download(model_name)
+        print(f"Model '{model_name}' is in the Hugging Face cache")
+    print('-'*50)
+
+    warm_encoder()
+    print('-'*50)
+
+    warm_indexes()
+    print('-'*50)
+
+    # Bytecode of the entry points and utils, compiled once instead of by the first process
+    compileall.compile_dir(os.path.dirname(os.path.abspath(__file__)), quiet=1)
+    compileall.compile_file("main.py", quiet=1)
+    print("Warmup completed. Set QUERY_ENCODER_MODE=onnx-int8 to start without loading torch.")
+
+if __name__ == "__main__":
+    main()